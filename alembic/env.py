@@ -22,6 +22,8 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from memory import models
+# Migrations see the embeddings table as stored for alembic -x embedding_storage=<storage>
+models.configure_embedding_storage(context.get_x_argument(as_dictionary=True).get('embedding_storage', 'float32'))
 target_metadata = Base.metadata
 settings = Settings() # noqa
 config.set_main_option('sqlalchemy.url', settings.database.uri)
@@ -0,0 +1,32 @@
+"""add conversations consolidated at
+
+Revision ID: a9c3e7f5d2b8
+Revises: f2b7d4a8c6e1
+Create Date: 2026-10-17 12:48:33.915604
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c3e7f5d2b8'
+down_revision: Union[str, Sequence[str], None] = 'f2b7d4a8c6e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversations', sa.Column('consolidated_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_conversations_unconsolidated', 'conversations', ['id'], unique=False,
+                    postgresql_where=sa.text('consolidated_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conversations_unconsolidated', table_name='conversations',
+                  postgresql_where=sa.text('consolidated_at IS NULL'))
+    op.drop_column('conversations', 'consolidated_at')
@@ -0,0 +1,30 @@
+"""add embeddings hnsw index
+
+Revision ID: b1c4e8f2a9d3
+Revises: 7340ee15c89b
+Create Date: 2026-10-16 10:12:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b1c4e8f2a9d3'
+down_revision: Union[str, Sequence[str], None] = '7340ee15c89b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_embeddings_vector_hnsw', 'embeddings', ['vector'], unique=False,
+                    postgresql_using='hnsw',
+                    postgresql_with={'m': 16, 'ef_construction': 64},
+                    postgresql_ops={'vector': 'vector_cosine_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_embeddings_vector_hnsw', table_name='embeddings')
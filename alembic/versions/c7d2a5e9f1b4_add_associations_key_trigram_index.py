@@ -0,0 +1,30 @@
+"""add associations key trigram index
+
+Revision ID: c7d2a5e9f1b4
+Revises: b1c4e8f2a9d3
+Create Date: 2026-10-16 14:03:17.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2a5e9f1b4'
+down_revision: Union[str, Sequence[str], None] = 'b1c4e8f2a9d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_associations_key_trgm', 'associations', ['key'], unique=False,
+                    postgresql_using='gin',
+                    postgresql_ops={'key': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_associations_key_trgm', table_name='associations')
@@ -0,0 +1,27 @@
+"""add conversations date index
+
+Revision ID: d3f8b6c1e2a7
+Revises: c7d2a5e9f1b4
+Create Date: 2026-10-16 16:41:05.227931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f8b6c1e2a7'
+down_revision: Union[str, Sequence[str], None] = 'c7d2a5e9f1b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_conversations_date'), 'conversations', ['date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_conversations_date'), table_name='conversations')
@@ -0,0 +1,72 @@
+"""compact embedding vectors
+
+Converts embeddings to the storage chosen on the command line, the schema never depends on the environment:
+
+    alembic -x embedding_storage=halfvec upgrade head
+
+float32, the default, keeps the current schema. Downgrade with the same argument. The app refuses to start
+when memory__embedding_storage does not name the storage the database holds.
+
+Revision ID: e5a1c9d7b3f2
+Revises: d3f8b6c1e2a7
+Create Date: 2026-10-16 23:08:17.604512
+
+"""
+from typing import Sequence, Union
+
+from alembic import context
+from alembic import op
+
+from memory.models import EMBEDDING_DIMENSIONS
+from memory.models import EMBEDDING_STORAGES
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a1c9d7b3f2'
+down_revision: Union[str, Sequence[str], None] = 'd3f8b6c1e2a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _embedding_storage() -> str:
+    storage = context.get_x_argument(as_dictionary=True).get('embedding_storage', 'float32')
+    if storage not in EMBEDDING_STORAGES:
+        raise ValueError(f"Unknown embedding storage {storage!r}, expected one of {', '.join(EMBEDDING_STORAGES)}")
+    return storage
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    storage = _embedding_storage()
+    if storage == 'float32':
+        return
+
+    op.drop_index('ix_embeddings_vector_hnsw', table_name='embeddings')
+    op.execute(f"ALTER TABLE embeddings ALTER COLUMN vector TYPE halfvec({EMBEDDING_DIMENSIONS}) "
+               f"USING vector::halfvec({EMBEDDING_DIMENSIONS})")
+    if storage == 'halfvec':
+        op.create_index('ix_embeddings_vector_hnsw', 'embeddings', ['vector'], unique=False,
+                        postgresql_using='hnsw',
+                        postgresql_with={'m': 16, 'ef_construction': 64},
+                        postgresql_ops={'vector': 'halfvec_cosine_ops'})
+    else:
+        # Must match the expression searched by the repositories to be used
+        op.execute(f"CREATE INDEX ix_embeddings_vector_binary_hnsw ON embeddings "
+                   f"USING hnsw ((CAST(binary_quantize(vector) AS bit({EMBEDDING_DIMENSIONS}))) bit_hamming_ops) "
+                   f"WITH (m = 16, ef_construction = 64)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Given the storage the upgrade was run with, so the downgrade can be rendered with --sql
+    if _embedding_storage() == 'float32':
+        return
+
+    op.execute("DROP INDEX IF EXISTS ix_embeddings_vector_binary_hnsw")
+    op.execute("DROP INDEX IF EXISTS ix_embeddings_vector_hnsw")
+    op.execute(f"ALTER TABLE embeddings ALTER COLUMN vector TYPE vector({EMBEDDING_DIMENSIONS}) "
+               f"USING vector::vector({EMBEDDING_DIMENSIONS})")
+    op.create_index('ix_embeddings_vector_hnsw', 'embeddings', ['vector'], unique=False,
+                    postgresql_using='hnsw',
+                    postgresql_with={'m': 16, 'ef_construction': 64},
+                    postgresql_ops={'vector': 'vector_cosine_ops'})
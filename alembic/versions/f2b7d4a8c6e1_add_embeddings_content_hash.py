@@ -0,0 +1,34 @@
+"""add embeddings content hash
+
+Revision ID: f2b7d4a8c6e1
+Revises: e5a1c9d7b3f2
+Create Date: 2026-10-17 09:26:51.083417
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b7d4a8c6e1'
+down_revision: Union[str, Sequence[str], None] = 'e5a1c9d7b3f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows keep a null hash, their sentences are not stored to recompute it
+    op.add_column('embeddings', sa.Column('content_hash', sa.LargeBinary(), nullable=True))
+    op.create_index(op.f('ix_embeddings_content_hash'), 'embeddings', ['content_hash'], unique=True)
+    op.create_index('ix_associations_embedding_id_conversation_id', 'associations',
+                    ['embedding_id', 'conversation_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_associations_embedding_id_conversation_id', table_name='associations')
+    op.drop_index(op.f('ix_embeddings_content_hash'), table_name='embeddings')
+    op.drop_column('embeddings', 'content_hash')
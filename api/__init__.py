@@ -1,17 +1,116 @@
+import asyncio
+from contextlib import asynccontextmanager
+from functools import partial
+
 from fastapi import FastAPI
+from prometheus_client import make_asgi_app
 from starlette.middleware.cors import CORSMiddleware
 
+from api.dependencies import consolidate_memories
+from api.dependencies import remember_turns
+from api.middleware import ServerTimingMiddleware
 from api.routes import router
+from database import Database
+from memory.clients import AsyncLocalDictionaryClient
+from memory.clients import AsyncYandexDictionaryClient
+from memory.clients import LocalDictionaryClient
+from memory.clients import YandexDictionaryClient
+from memory.consolidation import ConsolidationWorker
+from memory.dictionary import SynonymCache
+from memory.journal import MemoryJournal
+from memory.journal import MemoryWriter
+from memory.models import configure_embedding_storage
+from memory.registry import ModelRegistry
+from memory.repositories import check_embedding_storage
+from memory.vectors import HotVectorIndex
 from settings import Settings
 
 
 def create_app() -> FastAPI:
     settings = Settings() # noqa
 
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        registry = ModelRegistry(settings.inference, settings.memory)
+        app.state.model_registry = registry
+
+        # One engine and connection pool per process
+        database = Database(settings.database)
+        app.state.database = database
+
+        # The embeddings schema must be the configured one, searches silently scan the table otherwise
+        configure_embedding_storage(settings.memory.embedding_storage)
+        with database.session as session:
+            check_embedding_storage(session, settings.memory.embedding_storage)
+
+        # Dictionary clients keep pooled connections and a shared synonyms cache
+        synonym_cache = None
+        if settings.yandex.local_path:
+            dictionary_client = LocalDictionaryClient.from_file(settings.yandex.local_path)
+            async_dictionary_client = AsyncLocalDictionaryClient(dictionary_client)
+        else:
+            if settings.yandex.cache_size > 0:
+                synonym_cache = SynonymCache(settings.yandex.cache_ttl_seconds,
+                                             settings.yandex.cache_size,
+                                             settings.yandex.cache_path)
+            dictionary_client = YandexDictionaryClient(settings.yandex, synonym_cache)
+            async_dictionary_client = AsyncYandexDictionaryClient(settings.yandex, synonym_cache)
+        app.state.dictionary_client = dictionary_client
+        app.state.async_dictionary_client = async_dictionary_client
+
+        # Latest memories searched in process before pgvector
+        hot_index = None
+        if settings.memory.hot_tier_capacity > 0:
+            hot_index = HotVectorIndex(settings.memory.hot_tier_path, settings.memory.hot_tier_capacity)
+        app.state.hot_vector_index = hot_index
+
+        journal, writer = None, None
+        if settings.memory.write_behind:
+            journal = MemoryJournal(settings.memory.journal_path, settings.memory.journal_max_attempts)
+            writer = MemoryWriter(journal,
+                                  partial(remember_turns, settings, database, registry, hot_index),
+                                  settings.memory.journal_batch_size,
+                                  settings.memory.journal_flush_interval_ms,
+                                  settings.memory.journal_max_backoff_ms)
+        app.state.memory_journal = journal
+
+        consolidation_worker = None
+        if settings.memory.consolidation_interval_seconds > 0:
+            consolidation_worker = ConsolidationWorker(partial(consolidate_memories, settings, database, registry),
+                                                       settings.memory.consolidation_interval_seconds,
+                                                       settings.memory.consolidation_pause_ms)
+
+        async def load():
+            # Models are loaded in the background, /api/ready reports when they are warm
+            await asyncio.to_thread(registry.load)
+            # Turns left in the journal by a previous run are persisted once embeddings are available
+            if writer is not None:
+                writer.start()
+            if consolidation_worker is not None:
+                consolidation_worker.start()
+
+        loading = asyncio.create_task(load())
+        yield
+        await asyncio.gather(loading, return_exceptions=True)
+        if consolidation_worker is not None:
+            await asyncio.to_thread(consolidation_worker.stop)
+        if writer is not None:
+            await asyncio.to_thread(writer.stop)
+            journal.close()
+        if hot_index is not None:
+            hot_index.flush()
+        registry.close()
+        dictionary_client.close()
+        await async_dictionary_client.close()
+        if synonym_cache is not None:
+            synonym_cache.close()
+        await database.dispose()
+
     app = FastAPI(
         openapi_tags=[
             {'name': 'Memory GPT', 'description': 'Memory GPT that remembers something.'}
-        ]
+        ],
+        lifespan=lifespan
     )
 
     origins = [
@@ -26,6 +125,9 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    app.add_middleware(ServerTimingMiddleware, path_prefix='/api/chat')
+
     app.include_router(router, prefix='/api', tags=['API'])
+    app.mount('/metrics', make_asgi_app())
 
     return app
@@ -1,19 +1,44 @@
+from typing import AsyncIterator
+from typing import Iterator
+
 from fastapi import Depends
+from fastapi import HTTPException
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 from database import Database
+from database.uows import AsyncUnitOfWorkInterface
+from database.uows import AsyncUnitOfWorkSQLAlchemy
+from database.uows import UnitOfWorkInterface
+from database.uows import UnitOfWorkSQLAlchemy
+from memory.clients import AsyncDictionaryClientInterface
+from memory.clients import AsyncGeminiClient
+from memory.clients import AsyncGptClientInterface
+from memory.clients import AsyncStubGptClient
 from memory.clients import AttentionClientInterface
-from memory.clients import AttentionClientV1
 from memory.clients import DictionaryClientInterface
 from memory.clients import GeminiClient
 from memory.clients import GptClientInterface
 from memory.clients import SentenceEmbeddingInterface
-from memory.clients import SentenceEmbeddingV1
-from memory.clients import YandexDictionaryClient
+from memory.clients import StubGptClient
+from memory.consolidation import MemoryConsolidator
+from memory.dtos import MemoryTurnDTO
+from memory.intents import TemporalIntentDetector
+from memory.journal import MemoryJournalInterface
+from memory.registry import ModelRegistry
 from memory.repositories import AssociationRepositoryInterface
 from memory.repositories import AssociationRepositoryV1
+from memory.repositories import AsyncAssociationRepositoryInterface
+from memory.repositories import AsyncAssociationRepositoryV1
+from memory.repositories import ConsolidationRepositoryV1
+from memory.services import AsyncMemoryServiceInterface
+from memory.services import AsyncMemoryServiceV1
+from memory.services import AsyncMemoryServiceV2
 from memory.services import MemoryServiceInterface
 from memory.services import MemoryServiceV1
 from memory.services import MemoryServiceV2
+from memory.vectors import HotVectorIndex
 from settings import Settings
 
 
@@ -21,28 +46,93 @@ def get_settings() -> Settings:
     return Settings()  # noqa
 
 
-def get_database(settings: Settings = Depends(get_settings)) -> Database:
-    return Database(settings.database)
+def get_database(request: Request) -> Database:
+    return request.app.state.database
+
+
+def get_session(database: Database = Depends(get_database)) -> Iterator[Session]:
+    session = database.session
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+async def get_async_session(database: Database = Depends(get_database)) -> AsyncIterator[AsyncSession]:
+    session = database.async_session
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+def get_unit_of_work(session: Session = Depends(get_session)) -> UnitOfWorkInterface:
+    return UnitOfWorkSQLAlchemy(session)
+
 
+def get_async_unit_of_work(session: AsyncSession = Depends(get_async_session)) -> AsyncUnitOfWorkInterface:
+    return AsyncUnitOfWorkSQLAlchemy(session)
 
-def get_association_repository_v1(database: Database = Depends(get_database)) -> AssociationRepositoryInterface:
-    return AssociationRepositoryV1(database.session)
+
+def get_association_repository_v1(
+        settings: Settings = Depends(get_settings),
+        session: Session = Depends(get_session)) -> AssociationRepositoryInterface:
+    return AssociationRepositoryV1(session, settings.memory.embedding_ef_search, settings.memory.embedding_storage,
+                                   settings.memory.embedding_rerank_factor)
+
+
+def get_async_association_repository_v1(
+        settings: Settings = Depends(get_settings),
+        session: AsyncSession = Depends(get_async_session)) -> AsyncAssociationRepositoryInterface:
+    return AsyncAssociationRepositoryV1(session, settings.memory.embedding_ef_search,
+                                        settings.memory.embedding_storage, settings.memory.embedding_rerank_factor)
 
 
 def get_gpt_client(settings: Settings = Depends(get_settings)) -> GptClientInterface:
+    if settings.google.stub:
+        return StubGptClient()
     return GeminiClient(settings.google, "default", 0.5)
 
 
-def get_attention_client_v1() -> AttentionClientInterface:
-    return AttentionClientV1()
+def get_async_gpt_client(settings: Settings = Depends(get_settings)) -> AsyncGptClientInterface:
+    if settings.google.stub:
+        return AsyncStubGptClient(StubGptClient())
+    return AsyncGeminiClient(settings.google, "default", 0.5)
+
+
+def get_model_registry(request: Request) -> ModelRegistry:
+    registry = request.app.state.model_registry
+    if not registry.is_ready:
+        raise HTTPException(status_code=503, detail='Models are still loading')
+    return registry
+
 
+def get_attention_client_v1(registry: ModelRegistry = Depends(get_model_registry)) -> AttentionClientInterface:
+    return registry.attention_client
 
-def get_dictionary_client(settings: Settings = Depends(get_settings)) -> DictionaryClientInterface:
-    return YandexDictionaryClient(settings.yandex)
 
+def get_dictionary_client(request: Request) -> DictionaryClientInterface:
+    return request.app.state.dictionary_client
 
-def get_sentence_embedding_client() -> SentenceEmbeddingInterface:
-    return SentenceEmbeddingV1()
+
+def get_async_dictionary_client(request: Request) -> AsyncDictionaryClientInterface:
+    return request.app.state.async_dictionary_client
+
+
+def get_sentence_embedding_client(registry: ModelRegistry = Depends(get_model_registry)) -> SentenceEmbeddingInterface:
+    return registry.sentence_embedding
+
+
+def get_temporal_intent_detector(registry: ModelRegistry = Depends(get_model_registry)) -> TemporalIntentDetector:
+    return registry.temporal_intent_detector
+
+
+def get_memory_journal(request: Request) -> MemoryJournalInterface | None:
+    return request.app.state.memory_journal
+
+
+def get_hot_vector_index(request: Request) -> HotVectorIndex | None:
+    return request.app.state.hot_vector_index
 
 
 def get_association_service_v1(
@@ -51,13 +141,76 @@ def get_association_service_v1(
         repository: AssociationRepositoryInterface = Depends(get_association_repository_v1),
         attention_client: AttentionClientInterface = Depends(get_attention_client_v1),
         dictionary_client: DictionaryClientInterface = Depends(get_dictionary_client),
-        sentence_embedding_client: SentenceEmbeddingInterface = Depends(get_sentence_embedding_client)) -> MemoryServiceInterface:
-    return MemoryServiceV1(settings.memory, client, repository, attention_client, dictionary_client, sentence_embedding_client)
+        unit_of_work: UnitOfWorkInterface = Depends(get_unit_of_work)) -> MemoryServiceInterface:
+    return MemoryServiceV1(settings.memory, client, repository, attention_client, dictionary_client, unit_of_work)
 
 
 def get_association_service_v2(
         settings: Settings = Depends(get_settings),
         client: GptClientInterface = Depends(get_gpt_client),
         repository: AssociationRepositoryInterface = Depends(get_association_repository_v1),
-        sentence_embedding_client: SentenceEmbeddingInterface = Depends(get_sentence_embedding_client)) -> MemoryServiceInterface:
-    return MemoryServiceV2(settings.memory, client, repository, sentence_embedding_client)
+        sentence_embedding_client: SentenceEmbeddingInterface = Depends(get_sentence_embedding_client),
+        temporal_intent_detector: TemporalIntentDetector = Depends(get_temporal_intent_detector),
+        unit_of_work: UnitOfWorkInterface = Depends(get_unit_of_work),
+        journal: MemoryJournalInterface | None = Depends(get_memory_journal),
+        hot_index: HotVectorIndex | None = Depends(get_hot_vector_index)) -> MemoryServiceInterface:
+    return MemoryServiceV2(settings.memory, client, repository, sentence_embedding_client, temporal_intent_detector,
+                           unit_of_work, journal, hot_index)
+
+
+def get_async_association_service_v1(
+        settings: Settings = Depends(get_settings),
+        client: AsyncGptClientInterface = Depends(get_async_gpt_client),
+        repository: AsyncAssociationRepositoryInterface = Depends(get_async_association_repository_v1),
+        attention_client: AttentionClientInterface = Depends(get_attention_client_v1),
+        dictionary_client: AsyncDictionaryClientInterface = Depends(get_async_dictionary_client),
+        unit_of_work: AsyncUnitOfWorkInterface = Depends(get_async_unit_of_work)) -> AsyncMemoryServiceInterface:
+    return AsyncMemoryServiceV1(settings.memory, client, repository, attention_client, dictionary_client, unit_of_work)
+
+
+def get_async_association_service_v2(
+        settings: Settings = Depends(get_settings),
+        client: AsyncGptClientInterface = Depends(get_async_gpt_client),
+        repository: AsyncAssociationRepositoryInterface = Depends(get_async_association_repository_v1),
+        sentence_embedding_client: SentenceEmbeddingInterface = Depends(get_sentence_embedding_client),
+        temporal_intent_detector: TemporalIntentDetector = Depends(get_temporal_intent_detector),
+        unit_of_work: AsyncUnitOfWorkInterface = Depends(get_async_unit_of_work),
+        journal: MemoryJournalInterface | None = Depends(get_memory_journal),
+        hot_index: HotVectorIndex | None = Depends(get_hot_vector_index)) -> AsyncMemoryServiceInterface:
+    return AsyncMemoryServiceV2(settings.memory, client, repository, sentence_embedding_client,
+                                temporal_intent_detector, unit_of_work, journal, hot_index)
+
+
+def remember_turns(settings: Settings, database: Database, registry: ModelRegistry,
+                   hot_index: HotVectorIndex | None, turns: list[MemoryTurnDTO]):
+    """Persists journaled turns outside of a request, used by the memory writer"""
+    session = database.session
+    try:
+        service = MemoryServiceV2(settings.memory,
+                                  get_gpt_client(settings),
+                                  AssociationRepositoryV1(session, settings.memory.embedding_ef_search,
+                                                          settings.memory.embedding_storage,
+                                                          settings.memory.embedding_rerank_factor),
+                                  registry.sentence_embedding,
+                                  registry.temporal_intent_detector,
+                                  UnitOfWorkSQLAlchemy(session),
+                                  hot_index=hot_index)
+        service.remember(turns)
+    finally:
+        session.close()
+
+
+def consolidate_memories(settings: Settings, database: Database, registry: ModelRegistry) -> int:
+    """Consolidates one batch of old conversations outside of a request, used by the consolidation worker"""
+    session = database.session
+    try:
+        consolidator = MemoryConsolidator(settings.memory,
+                                          ConsolidationRepositoryV1(session, settings.memory.embedding_ef_search,
+                                                                    settings.memory.embedding_storage,
+                                                                    settings.memory.embedding_rerank_factor),
+                                          registry.sentence_embedding,
+                                          UnitOfWorkSQLAlchemy(session),
+                                          get_gpt_client(settings) if settings.memory.consolidation_summarize else None)
+        return consolidator.consolidate()
+    finally:
+        session.close()
@@ -0,0 +1,32 @@
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+from memory.tracing import start_request_timings
+from memory.tracing import to_server_timing
+
+
+class ServerTimingMiddleware:
+    """Adds the memory pipeline stage durations of a request to its Server-Timing header"""
+
+    def __init__(self, app: ASGIApp, path_prefix: str):
+        self._app = app
+        self._path_prefix = path_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or not scope['path'].startswith(self._path_prefix):
+            await self._app(scope, receive, send)
+            return
+
+        timings = start_request_timings()
+
+        async def send_with_timings(message: Message):
+            # A streamed response only reports the stages finished before its first byte
+            if message['type'] == 'http.response.start' and timings:
+                MutableHeaders(scope=message).append('Server-Timing', to_server_timing(timings))
+            await send(message)
+
+        await self._app(scope, receive, send_with_timings)
@@ -1,17 +1,69 @@
+import json
+import logging
+
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.dependencies import get_association_service_v1
-from api.dependencies import get_association_service_v2
+from api.dependencies import get_async_association_service_v2
+from api.dependencies import get_async_session
 from common import HumanResponse
-from memory.services import MemoryServiceInterface
+from memory.services import AsyncMemoryServiceInterface
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 @router.post('/chat', response_model=HumanResponse)
-def chat(
+async def chat(
+        request: HumanResponse,
+        service: AsyncMemoryServiceInterface = Depends(get_async_association_service_v2),
+):
+    return await service.chat(request)
+
+
+@router.post('/chat/stream')
+async def chat_stream(
         request: HumanResponse,
-        service: MemoryServiceInterface = Depends(get_association_service_v2),
+        service: AsyncMemoryServiceInterface = Depends(get_async_association_service_v2),
+        session: AsyncSession = Depends(get_async_session),
 ):
-    return service.chat(request)
+    """Server-sent events: answer deltas, then the complete response once the turn is remembered"""
+    async def events():
+        responded = False
+        try:
+            async for chunk in service.chat_stream(request):
+                if isinstance(chunk, HumanResponse):
+                    responded = True
+                    yield _to_event('response', chunk.model_dump_json())
+                else:
+                    yield _to_event('answer', json.dumps({'delta': chunk}, ensure_ascii=False))
+        except Exception:
+            logger.exception("Chat stream failed")
+            # The client keeps an answer it already rendered
+            if not responded:
+                yield _to_event('error', json.dumps({'detail': 'Chat failed'}))
+        finally:
+            # Dependencies are closed before a streaming body is sent, the session is reopened while streaming
+            await session.close()
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _to_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+@router.get('/ready')
+def ready(request: Request):
+    registry = request.app.state.model_registry
+    if registry.is_ready:
+        return {'status': 'ready'}
+    if registry.error is not None:
+        return JSONResponse(status_code=503, content={'status': 'failed', 'detail': str(registry.error)})
+    return JSONResponse(status_code=503, content={'status': 'loading'})
@@ -0,0 +1,112 @@
+"""
+Parity and speed of a CPU inference backend against the fp32 torch baseline
+
+    python -m benchmarks.inference --backend quantized
+
+The same parity checks run as tests in tests/test_inference_parity.py
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from memory.clients import AttentionClientInterface
+from memory.clients import AttentionClientV1
+from memory.clients import AttentionClientV2
+from memory.clients import SentenceEmbeddingInterface
+from memory.clients import SentenceEmbeddingV1
+from memory.clients import SentenceEmbeddingV2
+from memory.dtos import AttentionWord
+
+SENTENCES = [
+    'Привет',
+    'Как прошёл твой день?',
+    'Вчера мы гуляли в парке и кормили уток.',
+    'Мне нравится читать книги по вечерам.',
+    'Сегодня на работе было много встреч, я устал.',
+    'Помнишь, как мы ездили на море прошлым летом?',
+    'Мой кот опять разбил чашку на кухне.',
+    'Я думаю, что завтра пойдёт дождь.',
+    'Расскажи мне что-нибудь интересное.',
+    'Hello, how are you doing today?',
+    'Let us meet tomorrow at the coffee shop.',
+    'The weather was lovely yesterday.',
+]
+
+# Agreement with the fp32 baseline a backend must keep
+MIN_EMBEDDING_COSINE = 0.98
+MAX_ATTENTION_DIFFERENCE = 0.1
+
+
+def _timed(function, repeats: int) -> tuple[object, float]:
+    # The first call is a warmup and is not measured
+    result = function()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return result, (time.perf_counter() - start) / repeats
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def embedding_cosine(expected: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every candidate sentence embedding with its baseline one"""
+    return _cosine(np.asarray(expected), np.asarray(actual))
+
+
+def attention_difference(expected: list[list[AttentionWord]], actual: list[list[AttentionWord]]) -> float:
+    """Largest normalized word score difference, both share the tokenizer so words line up"""
+    return max(abs(e.value - a.value)
+               for expected_words, actual_words in zip(expected, actual)
+               for e, a in zip(expected_words, actual_words))
+
+
+def compare_embeddings(baseline: SentenceEmbeddingInterface, candidate: SentenceEmbeddingInterface,
+                       repeats: int) -> float:
+    expected, baseline_seconds = _timed(lambda: baseline.get_sentences_embeddings(SENTENCES), repeats)
+    actual, candidate_seconds = _timed(lambda: candidate.get_sentences_embeddings(SENTENCES), repeats)
+    cosine = embedding_cosine(expected, actual)
+    print(f"embeddings  baseline {baseline_seconds * 1000:8.1f} ms  candidate {candidate_seconds * 1000:8.1f} ms  "
+          f"speedup {baseline_seconds / candidate_seconds:4.2f}x  cosine min {cosine.min():.4f} mean {cosine.mean():.4f}")
+    return float(cosine.min())
+
+
+def compare_attention(baseline: AttentionClientInterface, candidate: AttentionClientInterface,
+                      repeats: int) -> float:
+    expected, baseline_seconds = _timed(lambda: baseline.attention_scores_batch(SENTENCES), repeats)
+    actual, candidate_seconds = _timed(lambda: candidate.attention_scores_batch(SENTENCES), repeats)
+    difference = attention_difference(expected, actual)
+    print(f"attention   baseline {baseline_seconds * 1000:8.1f} ms  candidate {candidate_seconds * 1000:8.1f} ms  "
+          f"speedup {baseline_seconds / candidate_seconds:4.2f}x  max score difference {difference:.4f}")
+    return difference
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['quantized', 'onnx'], default='quantized')
+    parser.add_argument('--onnx-file-name', default=None)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--min-cosine', type=float, default=MIN_EMBEDDING_COSINE,
+                        help='fail when any sentence embedding agrees less with the fp32 baseline')
+    parser.add_argument('--max-attention-difference', type=float, default=MAX_ATTENTION_DIFFERENCE,
+                        help='fail when any normalized word score moves further from the fp32 baseline')
+    args = parser.parse_args()
+
+    embedding_cosine = compare_embeddings(
+        SentenceEmbeddingV1(),
+        SentenceEmbeddingV2(args.backend, onnx_file_name=args.onnx_file_name),
+        args.repeats)
+    attention_difference = compare_attention(AttentionClientV1(), AttentionClientV2(), args.repeats)
+
+    if embedding_cosine < args.min_cosine or attention_difference > args.max_attention_difference:
+        print("parity check failed")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
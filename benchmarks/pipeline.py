@@ -0,0 +1,278 @@
+"""
+Load test of the chat pipeline with stub models, per stage latency percentiles and throughput
+
+    python -m benchmarks.pipeline --corpus 10000 --requests 500 --concurrency 4
+    python -m benchmarks.pipeline --repository postgres --corpus 10000
+    python -m benchmarks.pipeline --target app --requests 200
+
+The service target drives MemoryServiceV2.chat and reports embed, retrieve, dedupe, llm and persist
+separately, the app target drives POST /api/chat end to end. The postgres repository reads
+database__uri from the environment and needs the migrations applied.
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from datetime import timedelta
+from typing import Callable
+
+import numpy as np
+
+from benchmarks.stubs import AsyncInMemoryAssociationRepository
+from benchmarks.stubs import HashSentenceEmbedding
+from benchmarks.stubs import InMemoryAssociationRepository
+from benchmarks.stubs import NullUnitOfWork
+from common import HumanResponse
+from common import Language
+from memory.clients import StubGptClient
+from memory.dtos import MemoryTurnDTO
+from memory.intents import TemporalIntentDetector
+from memory.services import MemoryServiceV2
+from memory.settings import MemorySettings
+from memory.vectors import HotVectorIndex
+
+WORDS = ('кот собака парк море работа встреча книга фильм погода дождь солнце утро вечер друг семья '
+         'отпуск поезд город дом кухня чай кофе музыка концерт спорт бег велосипед сон праздник подарок').split()
+NAMES = ['Аня', 'Борис', 'Вера', 'Глеб']
+
+
+class StageTimer:
+    def __init__(self):
+        """
+        Collects durations per named stage, a stage inside another one is recorded as outer.inner
+        """
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.durations: dict[str, list[float]] = defaultdict(list)
+
+    @contextmanager
+    def stage(self, name: str):
+        stack = self._local.__dict__.setdefault('stack', [])
+        name = f"{stack[-1]}.{name}" if stack else name
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            self.record(name, elapsed)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.durations[name].append(seconds)
+
+    def timed(self, name: str, function: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def report(self, wall_seconds: float, requests: int):
+        print(f"{requests} requests in {wall_seconds:.2f} s, {requests / wall_seconds:.1f} requests/s")
+        print(f"{'stage':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, durations in sorted(self.durations.items()):
+            p50, p95, p99 = np.percentile(np.array(durations) * 1000, [50, 95, 99])
+            print(f"{name:<20}{len(durations):>8}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}")
+
+
+class _Timed:
+    def __init__(self, target, timer: StageTimer, stages: dict[str, str]):
+        """
+        Proxy timing the listed methods of the target as stages
+        """
+        self._target = target
+        self._timer = timer
+        self._stages = stages
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._target, name)
+        if name in self._stages:
+            return self._timer.timed(self._stages[name], attribute)
+        return attribute
+
+
+def memory_settings(args) -> MemorySettings:
+    return MemorySettings(language=Language.RU,
+                          attention_threshold=0.75,
+                          truncation_percentage=0.75,
+                          similarity_percentage=0.6,
+                          embedding_similarity_percentage=args.similarity,
+                          embedding_top_n=args.top_n)
+
+
+def random_message(rng: random.Random) -> str:
+    return '. '.join(' '.join(rng.choices(WORDS, k=rng.randint(3, 8))) for _ in range(rng.randint(1, 3)))
+
+
+def random_turn(rng: random.Random, date: datetime) -> MemoryTurnDTO:
+    name = rng.choice(NAMES)
+    response = HumanResponse(my_name_is='Бот', language=Language.RU, emotion='🙂',
+                             thought=random_message(rng), answer=random_message(rng), motion='',
+                             association_words=rng.choices(WORDS, k=3))
+    return MemoryTurnDTO(user_name=name, message=random_message(rng), emotion='🙂', response=response, date=date)
+
+
+def random_request(rng: random.Random) -> HumanResponse:
+    return HumanResponse(my_name_is=rng.choice(NAMES), language=Language.RU, emotion='🙂', thought='',
+                         answer=random_message(rng), motion='', association_words=[])
+
+
+class Pipeline:
+    def __init__(self, args, timer: StageTimer):
+        """
+        Builds request scoped services over one shared repository or database
+        """
+        self._args = args
+        self._timer = timer
+        self.settings = memory_settings(args)
+        self.sentence_embedding = HashSentenceEmbedding()
+        self.intent_detector = TemporalIntentDetector(self.sentence_embedding, self.settings.temporal_intents,
+                                                      self.settings.temporal_intent_threshold)
+        self.gpt_client = StubGptClient()
+        self.repository = InMemoryAssociationRepository() if args.repository == 'memory' else None
+        self.hot_index = HotVectorIndex(None, args.hot_tier) if args.hot_tier > 0 else None
+        self.database = None
+        if args.repository == 'postgres':
+            from database import Database
+            from settings import Settings
+            self.database = Database(Settings().database)  # noqa
+
+    @contextmanager
+    def service(self, timed: bool):
+        session = None
+        if self.database is not None:
+            from database.uows import UnitOfWorkSQLAlchemy
+            from memory.repositories import AssociationRepositoryV1
+            session = self.database.session
+            repository = AssociationRepositoryV1(session, self.settings.embedding_ef_search,
+                                                 self.settings.embedding_storage, self.settings.embedding_rerank_factor)
+            unit_of_work = UnitOfWorkSQLAlchemy(session)
+        else:
+            repository, unit_of_work = self.repository, NullUnitOfWork()
+
+        sentence_embedding, gpt_client, hot_index = self.sentence_embedding, self.gpt_client, self.hot_index
+        if timed:
+            repository = _Timed(repository, self._timer, {'get_similar_conversations': 'retrieve',
+                                                          'get_conversations_by_ids': 'retrieve',
+                                                          'get_random_by_range': 'retrieve'})
+            sentence_embedding = _Timed(sentence_embedding, self._timer, {'get_sentences_embeddings': 'embed'})
+            gpt_client = _Timed(gpt_client, self._timer, {'chat_prompt': 'llm'})
+            if hot_index is not None:
+                hot_index = _Timed(hot_index, self._timer, {'search': 'hot_search'})
+
+        service = MemoryServiceV2(self.settings, gpt_client, repository, sentence_embedding,
+                                  self.intent_detector, unit_of_work, hot_index=hot_index)
+        if timed:
+            service._deduplicator = _Timed(service._deduplicator, self._timer, {'deduplicate': 'dedupe'})
+            service.remember = self._timer.timed('persist', service.remember)
+        try:
+            yield service
+        finally:
+            if session is not None:
+                session.close()
+
+    def seed(self, size: int, rng: random.Random):
+        # Turns are spread over the last 30 days, so temporal intents find something
+        now = datetime.now()
+        start = time.perf_counter()
+        for offset in range(0, size, 100):
+            turns = [random_turn(rng, now - timedelta(minutes=rng.randint(0, 30 * 24 * 60)))
+                     for _ in range(min(100, size - offset))]
+            with self.service(timed=False) as service:
+                service.remember(turns)
+        print(f"seeded {size} turns in {time.perf_counter() - start:.2f} s")
+
+    def close(self):
+        if self.database is not None:
+            asyncio.run(self.database.dispose())
+
+
+def run_service(pipeline: Pipeline, timer: StageTimer, args, rng: random.Random) -> float:
+    requests = [random_request(rng) for _ in range(args.requests)]
+
+    def chat(request: HumanResponse):
+        with pipeline.service(timed=True) as service:
+            start = time.perf_counter()
+            service.chat(request)
+            timer.record('total', time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(chat, requests))
+    return time.perf_counter() - start
+
+
+def run_app(pipeline: Pipeline, timer: StageTimer, args, rng: random.Random) -> float:
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from api import dependencies
+    from api.routes import router
+    from memory.clients import AsyncStubGptClient
+
+    # The routes and dependency graph of the real app, without loading models in its lifespan
+    app = FastAPI()
+    app.include_router(router, prefix='/api')
+    app.state.memory_journal = None
+    app.state.hot_vector_index = pipeline.hot_index
+    app.dependency_overrides[dependencies.get_sentence_embedding_client] = lambda: pipeline.sentence_embedding
+    app.dependency_overrides[dependencies.get_temporal_intent_detector] = lambda: pipeline.intent_detector
+    app.dependency_overrides[dependencies.get_async_gpt_client] = lambda: AsyncStubGptClient(pipeline.gpt_client)
+    app.dependency_overrides[dependencies.get_settings] = lambda: _AppSettings(pipeline.settings)
+    if pipeline.database is not None:
+        app.state.database = pipeline.database
+    else:
+        app.dependency_overrides[dependencies.get_async_association_repository_v1] = \
+            lambda: AsyncInMemoryAssociationRepository(pipeline.repository)
+        app.dependency_overrides[dependencies.get_async_unit_of_work] = NullUnitOfWork
+
+    requests = [random_request(rng).model_dump(mode='json') for _ in range(args.requests)]
+    with TestClient(app) as client:
+        def chat(request: dict):
+            with timer.stage('http'):
+                client.post('/api/chat', json=request).raise_for_status()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(chat, requests))
+        return time.perf_counter() - start
+
+
+class _AppSettings:
+    def __init__(self, memory: MemorySettings):
+        self.memory = memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=['service', 'app'], default='service')
+    parser.add_argument('--repository', choices=['memory', 'postgres'], default='memory')
+    parser.add_argument('--corpus', type=int, default=5000, help='turns stored before measuring')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--top-n', type=int, default=15)
+    parser.add_argument('--similarity', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--hot-tier', type=int, default=0, help='capacity of the in-process hot tier, 0 disables it')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    timer = StageTimer()
+    pipeline = Pipeline(args, timer)
+    try:
+        pipeline.seed(args.corpus, rng)
+        run = run_service if args.target == 'service' else run_app
+        wall_seconds = run(pipeline, timer, args, rng)
+        timer.report(wall_seconds, args.requests)
+    finally:
+        pipeline.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Offline stand-ins for the inference models and the memory database, used by the benchmarks
+"""
+import threading
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from memory.clients import SentenceEmbeddingInterface
+from memory.dtos import AssociationCreateDTO
+from memory.dtos import AssociationDTO
+from memory.dtos import ConversationCreateDTO
+from memory.dtos import ConversationDTO
+from memory.dtos import EmbeddingCreateDTO
+from memory.dtos import EmbeddingDTO
+from memory.repositories import AssociationRepositoryInterface
+from memory.repositories import AsyncAssociationRepositoryInterface
+
+
+class HashSentenceEmbedding(SentenceEmbeddingInterface):
+    model_name = "benchmark/hashed-bag-of-words"
+
+    def __init__(self, dimension: int = 768):
+        """
+        Sum of seeded random word vectors, sentences sharing words come out similar
+        """
+        self._dimension = dimension
+        self._words: dict[str, np.ndarray] = {}
+
+    def get_sentences_embeddings(self, sentences: list[str]) -> np.ndarray:
+        embeddings = np.zeros((len(sentences), self._dimension), dtype=np.float32)
+        for i, sentence in enumerate(sentences):
+            for word in sentence.lower().split():
+                embeddings[i] += self._word_vector(word)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.where(norms == 0, 1, norms)
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        if word not in self._words:
+            rng = np.random.default_rng(zlib.crc32(word.encode()))
+            self._words[word] = rng.standard_normal(self._dimension).astype(np.float32)
+        return self._words[word]
+
+
+class InMemoryAssociationRepository(AssociationRepositoryInterface):
+    def __init__(self):
+        """
+        Exact, brute force search over everything kept in process memory
+        """
+        self._lock = threading.Lock()
+        self._conversations: dict[int, ConversationDTO] = {}
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._size = 0
+        self._embedding_conversations: dict[int, list[int]] = {}
+        self._content_embeddings: dict[bytes, int] = {}
+
+    def create_conversation(self, create_dto: ConversationCreateDTO) -> ConversationDTO:
+        with self._lock:
+            conversation = ConversationDTO(id=len(self._conversations) + 1, **create_dto.model_dump())
+            self._conversations[conversation.id] = conversation
+        return conversation
+
+    def create_associations_bulk(self, create_dtos: list[AssociationCreateDTO]) -> list[AssociationDTO]:
+        with self._lock:
+            for dto in create_dtos:
+                self._embedding_conversations.setdefault(dto.embedding_id, []).append(dto.conversation_id)
+        return [AssociationDTO(id=0, **dto.model_dump()) for dto in create_dtos]
+
+    def create_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        vectors = self._normalize(np.array([dto.embedding for dto in create_dtos], dtype=np.float32))
+        with self._lock:
+            if self._size + len(vectors) > len(self._vectors):
+                grown = np.empty((max(1024, 2 * (self._size + len(vectors))), vectors.shape[1]), dtype=np.float32)
+                if self._size:
+                    grown[:self._size] = self._vectors[:self._size]
+                self._vectors = grown
+            self._vectors[self._size:self._size + len(vectors)] = vectors
+            ids = range(self._size + 1, self._size + len(vectors) + 1)
+            self._size += len(vectors)
+        return [EmbeddingDTO(id=embedding_id, **dto.model_dump()) for embedding_id, dto in zip(ids, create_dtos)]
+
+    def upsert_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        known = self.get_embedding_ids_by_hashes([dto.content_hash for dto in create_dtos])
+        new_dtos = list({dto.content_hash: dto for dto in create_dtos if dto.content_hash not in known}.values())
+        if new_dtos:
+            embeddings = self.create_embeddings_bulk(new_dtos)
+            with self._lock:
+                for embedding in embeddings:
+                    self._content_embeddings.setdefault(embedding.content_hash, embedding.id)
+                    known[embedding.content_hash] = self._content_embeddings[embedding.content_hash]
+        return [EmbeddingDTO(id=known[dto.content_hash], **dto.model_dump()) for dto in create_dtos]
+
+    def get_embedding_ids_by_hashes(self, content_hashes: list[bytes]) -> dict[bytes, int]:
+        with self._lock:
+            return {content: self._content_embeddings[content]
+                    for content in content_hashes if content in self._content_embeddings}
+
+    def get_conversation_by_id(self, conversation_id: int) -> ConversationDTO:
+        return self._conversations[conversation_id]
+
+    def get_conversations_by_ids(self, conversation_ids: list[int]) -> list[ConversationDTO]:
+        return [self._conversations[conversation_id]
+                for conversation_id in conversation_ids if conversation_id in self._conversations]
+
+    def get_similar_conversations(self, embeddings: np.ndarray, top_n: int,
+                                  similarity_threshold: float) -> list[ConversationDTO]:
+        if len(embeddings) == 0 or self._size == 0:
+            return []
+
+        queries = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            similarities = queries @ self._vectors[:self._size].T
+        top_n = min(top_n, self._size)
+        nearest = np.argpartition(-similarities, top_n - 1, axis=1)[:, :top_n]
+
+        # Same order as the database: by query sentence, then by distance, each conversation once
+        seen, conversations = set(), []
+        for query_index, candidates in enumerate(nearest):
+            for index in candidates[np.argsort(-similarities[query_index, candidates])]:
+                if similarities[query_index, index] < similarity_threshold:
+                    break
+                # A shared embedding contributes its top_n latest conversations
+                for conversation_id in reversed(self._embedding_conversations.get(int(index) + 1, [])[-top_n:]):
+                    if conversation_id not in seen:
+                        seen.add(conversation_id)
+                        conversations.append(self._conversations[conversation_id])
+        return conversations
+
+    def get_random_by_range(self, start: datetime, end: datetime, limit: int) -> list[ConversationDTO]:
+        in_range = [c for c in self._conversations.values() if start <= c.date < end]
+        if not in_range:
+            return []
+        rng = np.random.default_rng()
+        return [in_range[i] for i in rng.choice(len(in_range), size=min(limit, len(in_range)), replace=False)]
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+class AsyncInMemoryAssociationRepository(AsyncAssociationRepositoryInterface):
+    def __init__(self, repository: InMemoryAssociationRepository):
+        self._repository = repository
+
+    async def create_conversation(self, create_dto: ConversationCreateDTO) -> ConversationDTO:
+        return self._repository.create_conversation(create_dto)
+
+    async def create_associations_bulk(self, create_dtos: list[AssociationCreateDTO]) -> list[AssociationDTO]:
+        return self._repository.create_associations_bulk(create_dtos)
+
+    async def create_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        return self._repository.create_embeddings_bulk(create_dtos)
+
+    async def upsert_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        return self._repository.upsert_embeddings_bulk(create_dtos)
+
+    async def get_embedding_ids_by_hashes(self, content_hashes: list[bytes]) -> dict[bytes, int]:
+        return self._repository.get_embedding_ids_by_hashes(content_hashes)
+
+    async def get_conversation_by_id(self, conversation_id: int) -> ConversationDTO:
+        return self._repository.get_conversation_by_id(conversation_id)
+
+    async def get_conversations_by_ids(self, conversation_ids: list[int]) -> list[ConversationDTO]:
+        return self._repository.get_conversations_by_ids(conversation_ids)
+
+    async def get_similar_conversations(self, embeddings: np.ndarray, top_n: int,
+                                        similarity_threshold: float) -> list[ConversationDTO]:
+        return self._repository.get_similar_conversations(embeddings, top_n, similarity_threshold)
+
+    async def get_random_by_range(self, start: datetime, end: datetime, limit: int) -> list[ConversationDTO]:
+        return self._repository.get_random_by_range(start, end, limit)
+
+
+class NullUnitOfWork:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
@@ -1,19 +1,66 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.pool import QueuePool
 
+from database.metrics import PoolMetrics
+from database.metrics import instrumented_pool_class
 from database.settings import DatabaseSettings
 
 
 class Database:
     def __init__(self, settings: DatabaseSettings):
-        _engine = create_engine(
+        """
+        Owns the process wide engines and their connection pools, create it once per process
+        """
+        self._settings = settings
+        self._metrics = PoolMetrics('sync')
+        self._engine = create_engine(
             settings.uri,
             echo=False,
-            pool_pre_ping=True
+            pool_pre_ping=True,
+            poolclass=instrumented_pool_class(QueuePool, self._metrics),
+            **self._pool_options()
         )
-        self._session_maker = sessionmaker(bind=_engine, autocommit=False, autoflush=False)
+        self._metrics.watch(self._engine)
+        self._session_maker = sessionmaker(bind=self._engine, autocommit=False, autoflush=False)
+        self._async_metrics = PoolMetrics('async')
+        self._async_engine: AsyncEngine | None = None
+        self._async_session_maker = None
 
     @property
     def session(self) -> Session:
         return self._session_maker()
+
+    @property
+    def async_session(self) -> AsyncSession:
+        # The async engine is created on first use, sync only callers never need asyncpg
+        if self._async_session_maker is None:
+            self._async_engine = create_async_engine(
+                self._settings.async_uri,
+                echo=False,
+                pool_pre_ping=True,
+                poolclass=instrumented_pool_class(AsyncAdaptedQueuePool, self._async_metrics),
+                **self._pool_options()
+            )
+            self._async_metrics.watch(self._async_engine.sync_engine)
+            self._async_session_maker = sessionmaker(bind=self._async_engine, class_=AsyncSession,
+                                                     autocommit=False, autoflush=False, expire_on_commit=False)
+        return self._async_session_maker()
+
+    async def dispose(self):
+        self._engine.dispose()
+        if self._async_engine is not None:
+            await self._async_engine.dispose()
+
+    def _pool_options(self) -> dict:
+        return {
+            'pool_size': self._settings.pool_size,
+            'max_overflow': self._settings.max_overflow,
+            'pool_timeout': self._settings.pool_timeout,
+            'pool_recycle': self._settings.pool_recycle,
+        }
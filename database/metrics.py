@@ -0,0 +1,53 @@
+import time
+
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import Histogram
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import Pool
+
+POOL_CHECKOUT_SECONDS = Histogram('database_pool_checkout_seconds', 'Time waited for a pooled connection', ['pool'],
+                                  buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                                           2.5, 5.0, 10.0, 30.0))
+POOL_TIMEOUTS = Counter('database_pool_timeouts', 'Checkouts that gave up waiting for a pooled connection', ['pool'])
+POOL_CONNECTIONS = Gauge('database_pool_connections', 'Connections of the pool by state', ['pool', 'state'])
+
+
+class PoolMetrics:
+    def __init__(self, pool_name: str):
+        """
+        Checkout wait time, timeouts and connections of one connection pool, exported to Prometheus
+        """
+        self._pool_name = pool_name
+
+    def observe_checkout(self, wait_seconds: float, timed_out: bool):
+        if timed_out:
+            POOL_TIMEOUTS.labels(self._pool_name).inc()
+        else:
+            POOL_CHECKOUT_SECONDS.labels(self._pool_name).observe(wait_seconds)
+
+    def watch(self, engine: Engine):
+        # Read from engine.pool on every scrape, the engine replaces its pool when disposed
+        POOL_CONNECTIONS.labels(self._pool_name, 'size').set_function(lambda: engine.pool.size())
+        POOL_CONNECTIONS.labels(self._pool_name, 'checked_out').set_function(lambda: engine.pool.checkedout())
+        POOL_CONNECTIONS.labels(self._pool_name, 'overflow').set_function(lambda: engine.pool.overflow())
+
+
+class _InstrumentedPoolMixin:
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            self.metrics.observe_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.observe_checkout(time.perf_counter() - start, timed_out=False)
+        return connection
+
+
+def instrumented_pool_class(pool_class: type[Pool], metrics: PoolMetrics) -> type[Pool]:
+    # Metrics live on the class, so pools recreated by the engine keep reporting to them
+    return type(f'Instrumented{pool_class.__name__}', (_InstrumentedPoolMixin, pool_class), {'metrics': metrics})
@@ -1,5 +1,15 @@
 from pydantic_settings import BaseSettings
+from sqlalchemy.engine import make_url
 
 
 class DatabaseSettings(BaseSettings):
     uri: str
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = 1800
+
+    @property
+    def async_uri(self) -> str:
+        return make_url(self.uri).set(drivername='postgresql+asyncpg').render_as_string(hide_password=False)
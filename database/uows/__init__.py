@@ -1,4 +1,6 @@
+from database.uows.base import AsyncUnitOfWorkInterface
 from database.uows.base import UnitOfWorkInterface
+from database.uows.sqlalchemy import AsyncUnitOfWorkSQLAlchemy
 from database.uows.sqlalchemy import UnitOfWorkSQLAlchemy
 
-__all__ = ['UnitOfWorkInterface', 'UnitOfWorkSQLAlchemy']
+__all__ = ['AsyncUnitOfWorkInterface', 'AsyncUnitOfWorkSQLAlchemy', 'UnitOfWorkInterface', 'UnitOfWorkSQLAlchemy']
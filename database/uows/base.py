@@ -13,3 +13,17 @@ class UnitOfWorkInterface(Protocol):
 
     def rollback(self):
         raise NotImplementedError
+
+
+class AsyncUnitOfWorkInterface(Protocol):
+    async def __aenter__(self):
+        raise NotImplementedError
+
+    async def __aexit__(self, *args):
+        raise NotImplementedError
+
+    async def commit(self):
+        raise NotImplementedError
+
+    async def rollback(self):
+        raise NotImplementedError
@@ -1,25 +1,49 @@
-from database import Database
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 
 class UnitOfWorkSQLAlchemy:
 
-    def __init__(self, db: Database):
-        self._db = db
-        self.session = None
+    def __init__(self, session: Session):
+        self.session = session
 
     def __enter__(self):
-        self.session = self._db.session
+        # Repositories sharing the session flush instead of committing until exit
+        self.session.info['unit_of_work'] = True
         return self
 
     def __exit__(self, *args):
+        self.session.info.pop('unit_of_work', None)
         if any(args):
             self.rollback()
         else:
             self.commit()
-        self.session.close()
 
     def commit(self):
         self.session.commit()
 
     def rollback(self):
         self.session.rollback()
+
+
+class AsyncUnitOfWorkSQLAlchemy:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def __aenter__(self):
+        self.session.sync_session.info['unit_of_work'] = True
+        return self
+
+    async def __aexit__(self, *args):
+        self.session.sync_session.info.pop('unit_of_work', None)
+        if any(args):
+            await self.rollback()
+        else:
+            await self.commit()
+
+    async def commit(self):
+        await self.session.commit()
+
+    async def rollback(self):
+        await self.session.rollback()
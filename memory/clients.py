@@ -1,9 +1,20 @@
+import asyncio
+import hashlib
+import importlib.util
 import json
+import logging
+import math
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
 from typing import Protocol
 
 import google.generativeai as genai
+import httpx
 import numpy as np
 import requests
+import requests.adapters
 import torch
 from sentence_transformers import SentenceTransformer
 from transformers import AutoModel
@@ -13,44 +24,160 @@ from common import HumanResponse
 from common import Language
 from common import SingleWord
 from memory.converters import to_human_response
+from memory.dictionary import SynonymCache
 from memory.dtos import AttentionWord
 from memory.settings import GoogleSettings
 from memory.settings import YandexSettings
+from memory.tracing import LLM_TOKENS
+
+logger = logging.getLogger(__name__)
 
 
 class GptClientInterface(Protocol):
     def chat_prompt(self, context: str, message: str) -> HumanResponse:
         raise NotImplementedError
 
+    def chat_prompt_many(self, prompts: list[tuple[str, str]]) -> list[HumanResponse]:
+        """Answers independent (context, message) prompts concurrently, in order"""
+        raise NotImplementedError
+
     def single_word(self, context: str, message: str) -> SingleWord:
         raise NotImplementedError
 
 
-class GeminiClient(GptClientInterface):
+class AsyncGptClientInterface(Protocol):
+    async def chat_prompt(self, context: str, message: str) -> HumanResponse:
+        raise NotImplementedError
+
+    async def chat_prompt_many(self, prompts: list[tuple[str, str]]) -> list[HumanResponse]:
+        """Answers independent (context, message) prompts concurrently, in order"""
+        raise NotImplementedError
+
+    def chat_prompt_stream(self, context: str, message: str) -> AsyncIterator[str | HumanResponse]:
+        """Yields answer text deltas as they are generated, then the complete response"""
+        raise NotImplementedError
+
+    async def single_word(self, context: str, message: str) -> SingleWord:
+        raise NotImplementedError
+
+
+class _JsonStringFieldStream:
+    def __init__(self, field: str):
+        """
+        Extracts one string field from a JSON object that arrives in chunks, as it grows
+        """
+        self._key = re.compile(rf'"{re.escape(field)}"\s*:\s*"')
+        self._buffer = ""
+        self._cursor: int | None = None
+        self._done = False
+
+    def feed(self, chunk: str) -> str:
+        """Returns the newly completed part of the field value"""
+        self._buffer += chunk
+        if self._done:
+            return ""
+        if self._cursor is None:
+            match = self._key.search(self._buffer)
+            if match is None:
+                return ""
+            self._cursor = match.end()
+
+        # Advance over whole characters and escapes only, an escape may be split between chunks
+        start = end = self._cursor
+        while end < len(self._buffer):
+            char = self._buffer[end]
+            if char == '"':
+                self._done = True
+                break
+            if char == '\\':
+                size = self._escape_size(end)
+                if size is None:
+                    break
+                end += size
+            else:
+                end += 1
+        self._cursor = end
+        return json.loads(f'"{self._buffer[start:end]}"')
+
+    def _escape_size(self, position: int) -> int | None:
+        # \uXXXX, a high surrogate needs its low surrogate escape to decode
+        if self._buffer[position + 1:position + 2] != 'u':
+            return 2 if position + 2 <= len(self._buffer) else None
+        if position + 6 > len(self._buffer):
+            return None
+        if 0xD800 <= int(self._buffer[position + 2:position + 6], 16) <= 0xDBFF:
+            return 12 if position + 12 <= len(self._buffer) else None
+        return 6
+
+
+class _GeminiClientBase:
+    _model_name = "gemini-2.5-flash"
+    _chat_prompt_instruction = "Answer emotion field with emojies. Be sure to mention a littlge about each message of the background context that is provided in the message. Use emojies that differs from user."
+    _single_word_instruction = "Answer emotion fields with emojies. Be sure to mention a littlge about each message of the background context that is provided in the message. Use emojies that differs from user."
+
+    # Shared by every client of the process, configuring genai again would drop its transport
+    _lock = threading.Lock()
+    _configured_api_key: str | None = None
+    _models: dict[tuple[type, float, str], genai.GenerativeModel] = {}
+
     def __init__(self, settings: GoogleSettings, system_instruction: str, temperature: float):
-        genai.configure(api_key=settings.api_key)
+        with self._lock:
+            if _GeminiClientBase._configured_api_key != settings.api_key:
+                genai.configure(api_key=settings.api_key)
+                _GeminiClientBase._configured_api_key = settings.api_key
+                _GeminiClientBase._models.clear()
         self._temperature = temperature
         self._system_instruction = system_instruction
         self._max_output_tokens = settings.max_output_tokens
+        self._request_options = {"timeout": settings.timeout_seconds}
+        self._max_concurrency = settings.max_concurrency
+
+    def _chat_prompt_model(self) -> genai.GenerativeModel:
+        return self._model(HumanResponse, self._chat_prompt_instruction)
+
+    def _single_word_model(self) -> genai.GenerativeModel:
+        return self._model(SingleWord, self._single_word_instruction)
+
+    def _model(self, schema: type, system_instruction: str) -> genai.GenerativeModel:
+        key = (schema, self._temperature, system_instruction)
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = genai.GenerativeModel(model_name=self._model_name,
+                                                          generation_config={
+                                                              "temperature": self._temperature,
+                                                              "response_mime_type": "application/json",
+                                                              "response_schema": schema
+                                                          },
+                                                          system_instruction=system_instruction)
+            return self._models[key]
+
+    def _prompt(self, context: str, message: str) -> str:
+        return f"Background context: {context}\nMessage: {message}"
+
+    def _to_human_response(self, response) -> HumanResponse:
+        self._record_usage(response)
+        return self._parse_human_response(self._chunk_text(response))
+
+    def _record_usage(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        LLM_TOKENS.labels("prompt").inc(usage.prompt_token_count or 0)
+        LLM_TOKENS.labels("completion").inc(usage.candidates_token_count or 0)
+
+    def _chunk_text(self, response) -> str:
+        try:
+            return response.candidates[0].content.parts[0].text
+        except (AttributeError, IndexError):
+            return ""
 
-    def chat_prompt(self, context: str, message: str) -> HumanResponse:
-        model = genai.GenerativeModel(model_name="gemini-2.5-flash",
-                                      generation_config={
-                                          "temperature": self._temperature,
-                                          "response_mime_type": "application/json",
-                                          "response_schema": HumanResponse
-                                      },
-                                      system_instruction="Answer emotion field with emojies. Be sure to mention a littlge about each message of the background context that is provided in the message. Use emojies that differs from user.")
-        chat = model.start_chat()
-        response = chat.send_message(f"Background context: {context}\nMessage: {message}")
-        print(f"Background context: {context}\nMessage: {message}")
+    def _parse_human_response(self, json_text: str) -> HumanResponse:
         try:
-            json_text = response.candidates[0].content.parts[0].text
             data = json.loads(json_text)
             human_response = to_human_response(data)
             return human_response
         except Exception as e:
-            print(e, response)
+            logger.warning("Unexpected gemini response: %s", e)
             return HumanResponse(
                 my_name_is="",
                 motion="",
@@ -61,16 +188,7 @@ class GeminiClient(GptClientInterface):
                 association_words=[]
             )
 
-    def single_word(self, context: str, message: str) -> SingleWord:
-        model = genai.GenerativeModel(model_name="gemini-2.5-flash",
-                                      generation_config={
-                                          "temperature": self._temperature,
-                                          "response_mime_type": "application/json",
-                                          "response_schema": SingleWord
-                                      },
-                                      system_instruction="Answer emotion fields with emojies. Be sure to mention a littlge about each message of the background context that is provided in the message. Use emojies that differs from user.")
-        chat = model.start_chat()
-        response = chat.send_message(f"Background context: {context}\nMessage: {message}")
+    def _to_single_word(self, response) -> SingleWord:
         try:
             json_text = response.candidates[0].content.parts[0].text
             data = json.loads(json_text)
@@ -80,71 +198,205 @@ class GeminiClient(GptClientInterface):
             return SingleWord(word="")
 
 
+class GeminiClient(_GeminiClientBase, GptClientInterface):
+    def chat_prompt(self, context: str, message: str) -> HumanResponse:
+        logger.debug("Gemini chat prompt, context %d chars, message %d chars", len(context), len(message))
+        response = self._chat_prompt_model().generate_content(self._prompt(context, message),
+                                                              request_options=self._request_options)
+        return self._to_human_response(response)
+
+    def chat_prompt_many(self, prompts: list[tuple[str, str]]) -> list[HumanResponse]:
+        if len(prompts) < 2:
+            return [self.chat_prompt(context, message) for context, message in prompts]
+        with ThreadPoolExecutor(max_workers=min(self._max_concurrency, len(prompts))) as executor:
+            return list(executor.map(lambda prompt: self.chat_prompt(*prompt), prompts))
+
+    def single_word(self, context: str, message: str) -> SingleWord:
+        response = self._single_word_model().generate_content(self._prompt(context, message),
+                                                              request_options=self._request_options)
+        return self._to_single_word(response)
+
+
+class AsyncGeminiClient(_GeminiClientBase, AsyncGptClientInterface):
+    async def chat_prompt(self, context: str, message: str) -> HumanResponse:
+        logger.debug("Gemini chat prompt, context %d chars, message %d chars", len(context), len(message))
+        response = await self._chat_prompt_model().generate_content_async(self._prompt(context, message),
+                                                                          request_options=self._request_options)
+        return self._to_human_response(response)
+
+    async def chat_prompt_many(self, prompts: list[tuple[str, str]]) -> list[HumanResponse]:
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def chat_prompt(context: str, message: str) -> HumanResponse:
+            async with semaphore:
+                return await self.chat_prompt(context, message)
+
+        return list(await asyncio.gather(*[chat_prompt(context, message) for context, message in prompts]))
+
+    async def chat_prompt_stream(self, context: str, message: str) -> AsyncIterator[str | HumanResponse]:
+        logger.debug("Gemini chat prompt stream, context %d chars, message %d chars", len(context), len(message))
+        response = await self._chat_prompt_model().generate_content_async(self._prompt(context, message),
+                                                                          stream=True,
+                                                                          request_options=self._request_options)
+        answer = _JsonStringFieldStream("answer")
+        text = ""
+        async for chunk in response:
+            chunk_text = self._chunk_text(chunk)
+            text += chunk_text
+            delta = answer.feed(chunk_text)
+            if delta:
+                yield delta
+        # Usage of a stream is cumulative, the last chunk holds the totals
+        self._record_usage(response)
+        yield self._parse_human_response(text)
+
+    async def single_word(self, context: str, message: str) -> SingleWord:
+        response = await self._single_word_model().generate_content_async(self._prompt(context, message),
+                                                                          request_options=self._request_options)
+        return self._to_single_word(response)
+
+
+class StubGptClient(GptClientInterface):
+    def __init__(self, name: str = "Stub"):
+        """
+        Deterministic offline stand-in for the llm, the answer depends only on the prompt
+        """
+        self._name = name
+
+    def chat_prompt(self, context: str, message: str) -> HumanResponse:
+        digest = hashlib.sha256(f"{context}\0{message}".encode()).hexdigest()
+        words = [word.strip(".,!?:;") for word in message.split() if len(word.strip(".,!?:;")) > 3]
+        return HumanResponse(
+            my_name_is=self._name,
+            language=None,
+            emotion="🙂",
+            thought=f"Context has {context.count(chr(10) * 2)} memories.",
+            answer=f"Answer {digest[:8]} to: {message}",
+            motion="",
+            association_words=words[:3]
+        )
+
+    def chat_prompt_many(self, prompts: list[tuple[str, str]]) -> list[HumanResponse]:
+        return [self.chat_prompt(context, message) for context, message in prompts]
+
+    def single_word(self, context: str, message: str) -> SingleWord:
+        words = message.split()
+        return SingleWord(word=words[0] if words else "")
+
+
+class AsyncStubGptClient(AsyncGptClientInterface):
+    def __init__(self, client: StubGptClient):
+        self._client = client
+
+    async def chat_prompt(self, context: str, message: str) -> HumanResponse:
+        return self._client.chat_prompt(context, message)
+
+    async def chat_prompt_many(self, prompts: list[tuple[str, str]]) -> list[HumanResponse]:
+        return self._client.chat_prompt_many(prompts)
+
+    async def chat_prompt_stream(self, context: str, message: str) -> AsyncIterator[str | HumanResponse]:
+        human_response = self._client.chat_prompt(context, message)
+        for word in re.findall(r'\S+\s*', human_response.answer):
+            yield word
+        yield human_response
+
+    async def single_word(self, context: str, message: str) -> SingleWord:
+        return self._client.single_word(context, message)
+
+
 class AttentionClientInterface(Protocol):
     def attention_scores(self, sentence: str) -> list[AttentionWord]:
         raise NotImplementedError
 
+    def attention_scores_batch(self, sentences: list[str]) -> list[list[AttentionWord]]:
+        """Scores every sentence in one padded forward pass"""
+        raise NotImplementedError
+
 
 class AttentionClientV1(AttentionClientInterface):
+    # Importance is averaged over the heads of the last layers only
+    _attention_layers = 4
+
     def __init__(self):
         self._tokenizer = AutoTokenizer.from_pretrained("DeepPavlov/rubert-base-cased")
-        self._model = AutoModel.from_pretrained("DeepPavlov/rubert-base-cased", output_attentions=True)
+        self._model = AutoModel.from_pretrained("DeepPavlov/rubert-base-cased")
+        self._model.eval()
 
     def attention_scores(self, sentence: str) -> list[AttentionWord]:
-        inputs = self._tokenizer(sentence, return_tensors="pt", return_attention_mask=True)
-        with torch.no_grad():
-            outputs = self._model(**inputs)
-
-        # Last 4 layers, average over heads
-        att = torch.stack(outputs.attentions[-4:])  # [4, batch, heads, tokens, tokens]
-        att = att.mean(dim=0).mean(dim=1)  # [batch, tokens, tokens]
-        att = att[0]
+        return self.attention_scores_batch([sentence])[0]
 
-        # Token importance
-        importance = att.sum(dim=0)  # [tokens]
+    def attention_scores_batch(self, sentences: list[str]) -> list[list[AttentionWord]]:
+        if not sentences:
+            return []
 
-        # Convert token ids to words
-        tokens = self._tokenizer.convert_ids_to_tokens(inputs["input_ids"][0])
+        inputs = self._tokenizer(sentences, return_tensors="pt", padding=True, truncation=True,
+                                 return_attention_mask=True)
+        with torch.no_grad():
+            outputs = self._model(**inputs, output_hidden_states=True)
+            att = self._last_layers_attention(outputs.hidden_states, inputs["attention_mask"])  # [batch, tokens, tokens]
+
+        # Token importance, attention received from the real (not padding) tokens
+        mask = inputs["attention_mask"].to(att.dtype)
+        importance = (att * mask[:, :, None]).sum(dim=1)  # [batch, tokens]
+        return self._to_words(sentences, inputs, importance)
+
+    def _last_layers_attention(self, hidden_states: tuple[torch.Tensor, ...],
+                               attention_mask: torch.Tensor) -> torch.Tensor:
+        # Attention probabilities are recomputed from the inputs of the used layers only,
+        # instead of asking the model to return them for every layer
+        layers = self._model.encoder.layer[-self._attention_layers:]
+        layer_inputs = hidden_states[-self._attention_layers - 1:-1]
+        key_mask = (1.0 - attention_mask[:, None, None, :].to(hidden_states[0].dtype)) \
+            * torch.finfo(hidden_states[0].dtype).min
+
+        att = torch.zeros(())
+        for layer, hidden in zip(layers, layer_inputs):
+            self_attention = layer.attention.self
+            query = self._split_heads(self_attention.query(hidden), self_attention.num_attention_heads)
+            key = self._split_heads(self_attention.key(hidden), self_attention.num_attention_heads)
+            scores = query @ key.transpose(-1, -2) / math.sqrt(self_attention.attention_head_size)
+            # Average over heads
+            att = att + (scores + key_mask).softmax(dim=-1).mean(dim=1)
+        return att / len(layers)
+
+    def _split_heads(self, x: torch.Tensor, heads: int) -> torch.Tensor:
+        batch, tokens, hidden = x.shape
+        return x.view(batch, tokens, heads, hidden // heads).transpose(1, 2)  # [batch, heads, tokens, head size]
+
+    def _to_words(self, sentences: list[str], inputs, importance: torch.Tensor) -> list[list[AttentionWord]]:
+        # Subword tokens are merged into words with a scatter over word ids, special tokens have none
+        word_ids = torch.tensor([[-1 if word_id is None else word_id for word_id in inputs.word_ids(i)]
+                                 for i in range(len(sentences))])
+        valid = word_ids >= 0
+        words_per_sentence = word_ids.max(dim=1).values + 1  # [batch]
+        offsets = torch.cumsum(words_per_sentence, dim=0) - words_per_sentence
+        flat_ids = (word_ids + offsets[:, None])[valid]
+
+        total = int(words_per_sentence.sum())
+        sums = torch.zeros(total, dtype=importance.dtype).index_add_(0, flat_ids, importance[valid])
+        counts = torch.zeros(total, dtype=importance.dtype).index_add_(0, flat_ids, torch.ones_like(sums[flat_ids]))
+        present = counts > 0
+        scores = sums / counts.clamp(min=1)
+
+        # Min-max normalize per sentence
+        sentence_ids = torch.repeat_interleave(torch.arange(len(sentences)), words_per_sentence)
+        min_val = torch.full((len(sentences),), torch.inf).scatter_reduce(
+            0, sentence_ids[present], scores[present], reduce="amin")
+        max_val = torch.full((len(sentences),), -torch.inf).scatter_reduce(
+            0, sentence_ids[present], scores[present], reduce="amax")
+        range_val = max_val - min_val
+        range_val = torch.where(range_val == 0, torch.ones_like(range_val), range_val)
+        values = ((scores - min_val[sentence_ids]) / range_val[sentence_ids]).tolist()
 
         words_with_scores = []
-        current_word = ""
-        current_score = 0.0
-        count = 0
-
-        for token, score in zip(tokens, importance):
-            if token in ["[CLS]", "[SEP]", "[PAD]"]:
-                continue
-
-            if token.startswith("##"):
-                # Subword continuation
-                current_word += token[2:]
-            else:
-                # Save previous word
-                if current_word:
-                    words_with_scores.append(
-                        AttentionWord(word=current_word, value=current_score / count)
-                    )
-                current_word = token
-                current_score = 0.0
-                count = 0
-
-            current_score += score.item()
-            count += 1
-
-        # Add last word
-        if current_word:
-            words_with_scores.append(
-                AttentionWord(word=current_word, value=current_score / count)
-            )
-
-        # Min-max normalize
-        if words_with_scores:
-            values = [w.value for w in words_with_scores]
-            min_val, max_val = min(values), max(values)
-            range_val = max_val - min_val if max_val != min_val else 1.0
-            for w in words_with_scores:
-                w.value = (w.value - min_val) / range_val
-
+        for i, (offset, count) in enumerate(zip(offsets.tolist(), words_per_sentence.tolist())):
+            words = []
+            for word_id in range(count):
+                if not present[offset + word_id]:
+                    continue
+                start, end = inputs.word_to_chars(i, word_id)
+                words.append(AttentionWord(word=sentences[i][start:end], value=values[offset + word_id]))
+            words_with_scores.append(words)
         return words_with_scores
 
     def get_embedding(self, text: str) -> np.ndarray:
@@ -156,19 +408,45 @@ class AttentionClientV1(AttentionClientInterface):
         return emb.numpy()
 
 
+class AttentionClientV2(AttentionClientV1):
+    def __init__(self):
+        """
+        AttentionClientV1 with int8 dynamically quantized linear layers, for CPU inference
+        """
+        super().__init__()
+        self._model = torch.ao.quantization.quantize_dynamic(self._model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
 class DictionaryClientInterface(Protocol):
     def synonyms(self, word: str, language: Language) -> list[str]:
         raise NotImplementedError
 
+    def synonyms_many(self, words: list[str], language: Language) -> dict[str, list[str]]:
+        raise NotImplementedError
 
-class YandexDictionaryClient(DictionaryClientInterface):
-    def __init__(self, settings: YandexSettings):
-        self._url = f'https://dictionary.yandex.net/api/v1/dicservice.json/lookup?key={settings.api_key}'
 
-    def synonyms(self, word: str, language: Language) -> list[str]:
-        response = requests.get(f"{self._url}&lang={self._get_language_prefix(language)}&text={word}")
-        if response.status_code == 200:
-            json = response.json()
+class AsyncDictionaryClientInterface(Protocol):
+    async def synonyms(self, word: str, language: Language) -> list[str]:
+        raise NotImplementedError
+
+    async def synonyms_many(self, words: list[str], language: Language) -> dict[str, list[str]]:
+        raise NotImplementedError
+
+
+class _YandexDictionaryClientBase:
+    _url = 'https://dictionary.yandex.net/api/v1/dicservice.json/lookup'
+
+    def __init__(self, settings: YandexSettings, cache: SynonymCache | None = None):
+        self._api_key = settings.api_key
+        self._timeout = settings.timeout_seconds
+        self._max_concurrency = settings.max_concurrency
+        self._cache = cache
+
+    def _lookup_params(self, word: str, language: Language) -> dict:
+        return {'key': self._api_key, 'lang': self._get_language_prefix(language), 'text': word}
+
+    def _to_synonyms(self, status_code: int, json: dict) -> list[str]:
+        if status_code == 200:
             if json['code'] == 200 and json['def'] and len(json['def']) > 0:
                 return [synonym['text'] for synonym in json['def'][0]['tr']]
         return []
@@ -178,15 +456,173 @@ class YandexDictionaryClient(DictionaryClientInterface):
             return 'ru-ru'
         return ''
 
+    def _cached(self, words: list[str], language: Language) -> tuple[dict[str, list[str]], list[str]]:
+        words = list(dict.fromkeys(words))
+        found = self._cache.get_many(words, language) if self._cache is not None else {}
+        return found, [word for word in words if word not in found]
+
+    def _store(self, fetched: dict[str, list[str] | None], language: Language) -> dict[str, list[str]]:
+        # Failed lookups are answered with no synonyms but never cached
+        answered = {word: synonyms for word, synonyms in fetched.items() if synonyms is not None}
+        if self._cache is not None and answered:
+            self._cache.put_many(answered, language)
+        return {word: synonyms or [] for word, synonyms in fetched.items()}
+
+
+class YandexDictionaryClient(_YandexDictionaryClientBase, DictionaryClientInterface):
+    def __init__(self, settings: YandexSettings, cache: SynonymCache | None = None):
+        """
+        Keeps one pooled HTTP session, create it once per process
+        """
+        super().__init__(settings, cache)
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self._max_concurrency)
+        self._session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self._max_concurrency,
+                                            thread_name_prefix='yandex-dictionary')
+
+    def synonyms(self, word: str, language: Language) -> list[str]:
+        return self.synonyms_many([word], language)[word]
+
+    def synonyms_many(self, words: list[str], language: Language) -> dict[str, list[str]]:
+        found, missing = self._cached(words, language)
+        if missing:
+            fetched = dict(zip(missing, self._executor.map(lambda word: self._fetch(word, language), missing)))
+            found.update(self._store(fetched, language))
+        return {word: found[word] for word in words}
+
+    def close(self):
+        self._executor.shutdown()
+        self._session.close()
+
+    def _fetch(self, word: str, language: Language) -> list[str] | None:
+        try:
+            response = self._session.get(self._url, params=self._lookup_params(word, language), timeout=self._timeout)
+        except requests.RequestException:
+            logger.warning("Synonyms lookup failed for %r", word, exc_info=True)
+            return None
+        if response.status_code != 200:
+            logger.warning("Synonyms lookup for %r answered %d", word, response.status_code)
+            return None
+        return self._to_synonyms(response.status_code, response.json())
+
+
+class AsyncYandexDictionaryClient(_YandexDictionaryClientBase, AsyncDictionaryClientInterface):
+    def __init__(self, settings: YandexSettings, cache: SynonymCache | None = None):
+        """
+        Keeps one pooled HTTP client, create it once per process
+        """
+        super().__init__(settings, cache)
+        self._client = httpx.AsyncClient(
+            timeout=self._timeout,
+            limits=httpx.Limits(max_connections=self._max_concurrency,
+                                max_keepalive_connections=self._max_concurrency))
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+    async def synonyms(self, word: str, language: Language) -> list[str]:
+        return (await self.synonyms_many([word], language))[word]
+
+    async def synonyms_many(self, words: list[str], language: Language) -> dict[str, list[str]]:
+        # The cache reads and commits sqlite, which must not block the event loop
+        found, missing = await asyncio.to_thread(self._cached, words, language)
+        if missing:
+            fetched = await asyncio.gather(*[self._fetch(word, language) for word in missing])
+            found.update(await asyncio.to_thread(self._store, dict(zip(missing, fetched)), language))
+        return {word: found[word] for word in words}
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _fetch(self, word: str, language: Language) -> list[str] | None:
+        async with self._semaphore:
+            try:
+                response = await self._client.get(self._url, params=self._lookup_params(word, language))
+            except httpx.HTTPError:
+                logger.warning("Synonyms lookup failed for %r", word, exc_info=True)
+                return None
+        if response.status_code != 200:
+            logger.warning("Synonyms lookup for %r answered %d", word, response.status_code)
+            return None
+        return self._to_synonyms(response.status_code, response.json())
+
+
+class LocalDictionaryClient(DictionaryClientInterface):
+    def __init__(self, synonyms: dict[str, list[str]] | None = None):
+        """
+        Stand-in dictionary without network access, answers from a word -> synonyms mapping
+        """
+        self._synonyms = synonyms or {}
+
+    @classmethod
+    def from_file(cls, path: str) -> 'LocalDictionaryClient':
+        with open(path, encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def synonyms(self, word: str, language: Language) -> list[str]:
+        return list(self._synonyms.get(word, []))
+
+    def synonyms_many(self, words: list[str], language: Language) -> dict[str, list[str]]:
+        return {word: self.synonyms(word, language) for word in words}
+
+    def close(self):
+        pass
+
+
+class AsyncLocalDictionaryClient(AsyncDictionaryClientInterface):
+    def __init__(self, client: LocalDictionaryClient):
+        self._client = client
+
+    async def synonyms(self, word: str, language: Language) -> list[str]:
+        return self._client.synonyms(word, language)
+
+    async def synonyms_many(self, words: list[str], language: Language) -> dict[str, list[str]]:
+        return self._client.synonyms_many(words, language)
+
+    async def close(self):
+        pass
+
 
 class SentenceEmbeddingInterface(Protocol):
+    model_name: str
+
     def get_sentences_embeddings(self, sentences: list[str]) -> np.ndarray:
         raise NotImplementedError
 
 
 class SentenceEmbeddingV1(SentenceEmbeddingInterface):
-    def __init__(self):
-        self._model = SentenceTransformer("sentence-transformers/LaBSE")
+    model_name = "sentence-transformers/LaBSE"
+
+    def __init__(self, batch_size: int = 32):
+        self._model = SentenceTransformer(self.model_name)
+        self._batch_size = batch_size
+
+    def get_sentences_embeddings(self, sentences: list[str]) -> np.ndarray:
+        return self._model.encode(sentences, batch_size=self._batch_size)
+
+
+class SentenceEmbeddingV2(SentenceEmbeddingInterface):
+    def __init__(self, backend: str, batch_size: int = 32, onnx_file_name: str | None = None):
+        """
+        LaBSE on a CPU backend, int8 dynamically quantized weights or an exported ONNX graph
+        """
+        # Vectors differ slightly between backends, keep their cache entries apart
+        self.model_name = f"{SentenceEmbeddingV1.model_name}@{backend}"
+        self._batch_size = batch_size
+        if backend == 'quantized':
+            self._model = torch.ao.quantization.quantize_dynamic(
+                SentenceTransformer(SentenceEmbeddingV1.model_name), {torch.nn.Linear}, dtype=torch.qint8)
+        elif backend == 'onnx':
+            _require_modules('ONNX backend', 'onnxruntime', 'optimum')
+            model_kwargs = {'file_name': onnx_file_name} if onnx_file_name else None
+            self._model = SentenceTransformer(SentenceEmbeddingV1.model_name, backend='onnx', model_kwargs=model_kwargs)
+        else:
+            raise ValueError(f"Unknown sentence embedding backend {backend!r}")
 
     def get_sentences_embeddings(self, sentences: list[str]) -> np.ndarray:
-        return self._model.encode(sentences)
+        return self._model.encode(sentences, batch_size=self._batch_size)
+
+
+def _require_modules(feature: str, *modules: str):
+    missing = [module for module in modules if importlib.util.find_spec(module) is None]
+    if missing:
+        raise RuntimeError(f"{feature} requires {', '.join(missing)}, install with `pip install optimum[onnxruntime]`")
@@ -0,0 +1,215 @@
+import logging
+import re
+import threading
+from datetime import datetime
+from datetime import timedelta
+from typing import Callable
+
+import numpy as np
+
+from database.uows import UnitOfWorkInterface
+from memory.clients import GptClientInterface
+from memory.clients import SentenceEmbeddingInterface
+from memory.context import ContextBuilder
+from memory.converters import to_association_create_dto
+from memory.converters import to_embedding_create_dto
+from memory.dtos import AssociationVectorDTO
+from memory.dtos import ConversationDTO
+from memory.embeddings import content_hash
+from memory.repositories import ConsolidationRepositoryInterface
+from memory.settings import MemorySettings
+from memory.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def cluster_vectors(vectors: np.ndarray, similarity_threshold: float, max_clusters: int = 0) -> np.ndarray:
+    """
+    Centroid linkage on cosine similarity: the closest clusters are merged while they are similar enough,
+    or while more than max_clusters are left when it is above 0, returns the cluster label of every vector
+    """
+    sums = _normalize(vectors)
+    labels = np.arange(len(vectors))
+    active = np.ones(len(vectors), dtype=bool)
+    similarities = sums @ sums.T
+    np.fill_diagonal(similarities, -np.inf)
+
+    while active.sum() > 1:
+        i, j = np.unravel_index(np.argmax(similarities), similarities.shape)
+        if similarities[i, j] < similarity_threshold and (max_clusters <= 0 or active.sum() <= max_clusters):
+            break
+
+        sums[i] += sums[j]
+        labels[labels == j] = i
+        active[j] = False
+        similarities[j, :] = similarities[:, j] = -np.inf
+
+        row = np.where(active, _normalize(sums) @ _normalize(sums[i]), -np.inf)
+        row[i] = -np.inf
+        similarities[i, :] = similarities[:, i] = row
+
+    return np.unique(labels, return_inverse=True)[1]
+
+
+class MemoryConsolidator:
+    _summary_instruction = "Summarize the background context in two or three short sentences, answer with the summary."
+
+    def __init__(self, settings: MemorySettings,
+                 repository: ConsolidationRepositoryInterface,
+                 sentence_embedding: SentenceEmbeddingInterface,
+                 unit_of_work: UnitOfWorkInterface,
+                 client: GptClientInterface | None = None):
+        """
+        Merges near-duplicate associations of old conversations into centroid embeddings,
+        optionally adding a summary of each conversation written by the llm
+        """
+        self._settings = settings
+        self._repository = repository
+        self._sentence_embedding_client = sentence_embedding
+        self._unit_of_work = unit_of_work
+        self._client = client
+
+    def consolidate(self, now: datetime | None = None) -> int:
+        """Consolidates one batch of conversations in one transaction, returns how many were consolidated"""
+        before = (now or datetime.now()) - timedelta(days=self._settings.consolidation_age_days)
+        with self._unit_of_work:
+            conversations = self._repository.get_consolidation_candidates(before,
+                                                                          self._settings.consolidation_batch_size)
+        if not conversations:
+            return 0
+
+        # The llm is asked before locking, rows are only held for the database work
+        summaries = self._summarize(conversations) if self._client is not None else {}
+        with span('consolidation'), self._unit_of_work:
+            conversation_ids = self._repository.lock_for_consolidation([c.id for c in conversations])
+            associations = self._repository.get_association_vectors(conversation_ids)
+            by_conversation: dict[int, list[AssociationVectorDTO]] = {}
+            for association in associations:
+                by_conversation.setdefault(association.conversation_id, []).append(association)
+
+            merged = []
+            keys, vectors, owners = [], [], []
+            for conversation_id in conversation_ids:
+                for cluster in self._clusters(by_conversation.get(conversation_id, [])):
+                    merged += cluster
+                    centroid = self._centroid(cluster)
+                    keys.append(self._representative(cluster, centroid).key)
+                    vectors.append(centroid)
+                    owners.append(conversation_id)
+            self._create_associations(keys, vectors, owners)
+            self._create_summaries({conversation_id: summaries[conversation_id]
+                                    for conversation_id in conversation_ids if conversation_id in summaries})
+
+            self._repository.delete_associations([association.id for association in merged])
+            removed = self._repository.delete_orphan_embeddings(
+                list({association.embedding_id for association in merged}))
+            self._repository.mark_consolidated(conversation_ids, datetime.now())
+
+        logger.info("Consolidated %d conversations, %d associations merged, %d embeddings removed",
+                    len(conversation_ids), len(merged), removed)
+        return len(conversation_ids)
+
+    def _clusters(self, associations: list[AssociationVectorDTO]) -> list[list[AssociationVectorDTO]]:
+        # Single member clusters keep their association and embedding as they are
+        if len(associations) < 2:
+            return []
+        labels = cluster_vectors(np.array([association.vector for association in associations], dtype=np.float32),
+                                 self._settings.consolidation_similarity,
+                                 self._settings.consolidation_max_embeddings)
+        clusters: dict[int, list[AssociationVectorDTO]] = {}
+        for label, association in zip(labels, associations):
+            clusters.setdefault(int(label), []).append(association)
+        return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+    def _centroid(self, cluster: list[AssociationVectorDTO]) -> np.ndarray:
+        vectors = _normalize(np.array([association.vector for association in cluster], dtype=np.float32))
+        return _normalize(vectors.mean(axis=0))
+
+    def _representative(self, cluster: list[AssociationVectorDTO], centroid: np.ndarray) -> AssociationVectorDTO:
+        # The key of the member nearest to the centroid stands for the whole cluster
+        vectors = np.array([association.vector for association in cluster], dtype=np.float32)
+        return cluster[int(np.argmax(vectors @ centroid))]
+
+    def _create_associations(self, keys: list[str], vectors: list[np.ndarray], conversation_ids: list[int]):
+        # Centroids belong to their conversation, they are not shared by content hash
+        embeddings = self._repository.create_embeddings_bulk([to_embedding_create_dto(vector) for vector in vectors])
+        self._repository.create_associations_bulk(
+            [to_association_create_dto(key, conversation_id, embedding.id)
+             for key, conversation_id, embedding in zip(keys, conversation_ids, embeddings)])
+
+    def _summarize(self, conversations: list[ConversationDTO]) -> dict[int, str]:
+        prompts = []
+        for conversation in conversations:
+            context = ContextBuilder(self._settings.context_max_chars)
+            context.add(conversation)
+            prompts.append((context.build(), self._summary_instruction))
+        try:
+            with span('consolidation.llm'):
+                responses = self._client.chat_prompt_many(prompts)
+        except Exception:
+            # Consolidation goes on without summaries
+            logger.exception("Failed to summarize %d conversations", len(conversations))
+            return {}
+        return {conversation.id: response.answer for conversation, response in zip(conversations, responses)}
+
+    def _create_summaries(self, summaries: dict[int, str]):
+        keys, conversation_ids = [], []
+        for conversation_id, summary in summaries.items():
+            sentences = [sentence.strip() for sentence in re.split(r'\.\s*', summary) if sentence.strip()]
+            keys += sentences
+            conversation_ids += [conversation_id] * len(sentences)
+        if not keys:
+            return
+
+        model_name = self._sentence_embedding_client.model_name
+        embeddings = self._repository.upsert_embeddings_bulk(
+            [to_embedding_create_dto(vector, content_hash(model_name, key))
+             for key, vector in zip(keys, self._sentence_embedding_client.get_sentences_embeddings(keys))])
+        self._repository.create_associations_bulk(
+            [to_association_create_dto(key, conversation_id, embedding.id)
+             for key, conversation_id, embedding in zip(keys, conversation_ids, embeddings)])
+
+
+class ConsolidationWorker:
+    def __init__(self, consolidate: Callable[[], int], interval_seconds: float, pause_ms: float):
+        """
+        Background worker that consolidates old memories batch by batch on a schedule,
+        pausing between batches so chat queries keep the database
+        """
+        self._consolidate = consolidate
+        self._interval = interval_seconds
+        self._pause = pause_ms / 1000
+        self._stopping = threading.Event()
+        self._worker: threading.Thread | None = None
+
+    def start(self):
+        self._worker = threading.Thread(target=self._run, name='memory-consolidation', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        """Waits for the running batch, what is left is consolidated by the next run"""
+        if self._worker is None:
+            return
+        self._stopping.set()
+        self._worker.join()
+        self._worker = None
+
+    def _run(self):
+        while not self._stopping.wait(self._interval):
+            self._run_once()
+
+    def _run_once(self):
+        # Every batch commits on its own, an interrupted run resumes from the conversations left
+        while not self._stopping.is_set():
+            try:
+                consolidated = self._consolidate()
+            except Exception:
+                logger.exception("Memory consolidation failed")
+                return
+            if not consolidated or self._stopping.wait(self._pause):
+                return
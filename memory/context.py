@@ -0,0 +1,40 @@
+from typing import Iterable
+
+from memory.dtos import ConversationDTO
+
+
+class ContextBuilder:
+    def __init__(self, max_chars: int):
+        """
+        Collects memory snippets most relevant first and renders them once within a character budget
+        """
+        self._max_chars = max_chars
+        self._snippets: list[str] = []
+        self._conversation_ids: set[int] = set()
+
+    def add(self, conversation: ConversationDTO):
+        # A conversation found by several lookups keeps its best rank
+        if conversation.id in self._conversation_ids:
+            return
+        self._conversation_ids.add(conversation.id)
+        self._snippets.append(self._to_snippet(conversation))
+
+    def add_all(self, conversations: Iterable[ConversationDTO]):
+        for conversation in conversations:
+            self.add(conversation)
+
+    def build(self) -> str:
+        # The lowest ranked snippets are dropped first once the budget is spent
+        size = 0
+        snippets = []
+        for snippet in self._snippets:
+            size += len(snippet)
+            if size > self._max_chars:
+                break
+            snippets.append(snippet)
+        return ''.join(snippets)
+
+    def _to_snippet(self, conversation: ConversationDTO) -> str:
+        return (f"[{conversation.date}]({conversation.emotion})"
+                f"Negotiator({conversation.user_name}): {conversation.user_message}\n"
+                f"Your name({conversation.my_name}): {conversation.my_message}\n\n")
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Any
 
 import numpy as np
@@ -21,14 +22,16 @@ def to_association_create_dto(association: str,
 
 def to_conversation_create_dto(human_response: HumanResponse,
                               user_name: str,
-                              user_message: str) -> ConversationCreateDTO:
+                              user_message: str,
+                              date: datetime | None = None) -> ConversationCreateDTO:
     return ConversationCreateDTO(
         user_name=user_name,
         user_message=user_message,
         my_message=human_response.answer,
         my_name=human_response.my_name_is,
         emotion=human_response.emotion,
-        language=human_response.language
+        language=human_response.language,
+        date=date or datetime.now()
     )
 
 
@@ -53,5 +56,5 @@ def try_enum(enum_class, value):
         return None
 
 
-def to_embedding_create_dto(embedding: np.ndarray) -> EmbeddingCreateDTO:
-    return EmbeddingCreateDTO(embedding=embedding.tolist())
+def to_embedding_create_dto(embedding: np.ndarray, content_hash: bytes | None = None) -> EmbeddingCreateDTO:
+    return EmbeddingCreateDTO(embedding=embedding.tolist(), content_hash=content_hash)
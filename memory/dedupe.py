@@ -0,0 +1,54 @@
+import re
+import zlib
+
+import numpy as np
+
+from memory.dtos import ConversationDTO
+
+# Prime above 2^32, so a * hash + b of 32 bit values never overflows uint64
+_PRIME = np.uint64(4294967311)
+
+
+class MinHashDeduplicator:
+    def __init__(self, threshold: float, num_permutations: int = 64, shingle_size: int = 3, seed: int = 1):
+        """
+        Suppresses near duplicate conversations with MinHash signatures of character shingles
+        """
+        self._threshold = threshold
+        self._shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 32, size=num_permutations, dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=num_permutations, dtype=np.uint64)
+
+    def deduplicate(self, conversations: list[ConversationDTO]) -> list[ConversationDTO]:
+        """Keeps the first, best ranked, conversation of every group whose both messages are near duplicates"""
+        if len(conversations) < 2:
+            return list(conversations)
+
+        user_signatures = self.signatures([conversation.user_message for conversation in conversations])
+        my_signatures = self.signatures([conversation.my_message for conversation in conversations])
+        duplicates = (self._similarity(user_signatures) >= self._threshold) & \
+                     (self._similarity(my_signatures) >= self._threshold)
+
+        kept = np.zeros(len(conversations), dtype=bool)
+        for i in range(len(conversations)):
+            kept[i] = not (duplicates[i] & kept).any()
+        return [conversation for conversation, keep in zip(conversations, kept) if keep]
+
+    def signatures(self, texts: list[str]) -> np.ndarray:
+        signatures = np.empty((len(texts), len(self._a)), dtype=np.uint64)
+        for i, text in enumerate(texts):
+            hashes = np.fromiter((zlib.crc32(shingle.encode()) for shingle in self._shingles(text)), dtype=np.uint64)
+            signatures[i] = ((np.outer(self._a, hashes) + self._b[:, None]) % _PRIME).min(axis=1)
+        return signatures
+
+    def _similarity(self, signatures: np.ndarray) -> np.ndarray:
+        # Share of equal minimums estimates the Jaccard similarity of the shingle sets
+        return (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+
+    def _shingles(self, text: str) -> set[str]:
+        # Case, punctuation and spacing do not make a conversation different
+        text = ' '.join(re.sub(r'\W+', ' ', text.lower()).split())
+        if len(text) <= self._shingle_size:
+            return {text}
+        return {text[i:i + self._shingle_size] for i in range(len(text) - self._shingle_size + 1)}
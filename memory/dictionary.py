@@ -0,0 +1,83 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from common import Language
+
+
+class SynonymCache:
+    def __init__(self, ttl_seconds: float, max_size: int, path: str | None = None):
+        """
+        Time limited (word, language) -> synonyms cache, in memory and optionally in a local SQLite file
+        """
+        self._ttl = ttl_seconds
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str], tuple[float, list[str]]] = OrderedDict()
+        self._connection: sqlite3.Connection | None = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                                     CREATE TABLE IF NOT EXISTS synonyms (
+                                         word TEXT NOT NULL,
+                                         language TEXT NOT NULL,
+                                         synonyms TEXT NOT NULL,
+                                         expires_at REAL NOT NULL,
+                                         PRIMARY KEY (word, language)
+                                     )
+                                     """)
+            self._connection.execute("DELETE FROM synonyms WHERE expires_at <= ?", (time.time(),))
+
+    def get_many(self, words: list[str], language: Language) -> dict[str, list[str]]:
+        """Returns cached synonyms of the words that are known and not expired"""
+        now = time.time()
+        found = {}
+        with self._lock:
+            missing = []
+            for word in words:
+                entry = self._entries.get((word, language.value))
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end((word, language.value))
+                    found[word] = entry[1]
+                else:
+                    missing.append(word)
+
+            if missing and self._connection is not None:
+                rows = self._connection.execute(
+                    f"SELECT word, synonyms, expires_at FROM synonyms "
+                    f"WHERE language = ? AND expires_at > ? AND word IN ({', '.join('?' * len(missing))})",
+                    (language.value, now, *missing)).fetchall()
+                for word, synonyms, expires_at in rows:
+                    found[word] = json.loads(synonyms)
+                    self._remember((word, language.value), expires_at, found[word])
+        return found
+
+    def put_many(self, synonyms: dict[str, list[str]], language: Language):
+        expires_at = time.time() + self._ttl
+        with self._lock:
+            for word, word_synonyms in synonyms.items():
+                self._remember((word, language.value), expires_at, word_synonyms)
+            if self._connection is not None:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO synonyms (word, language, synonyms, expires_at) VALUES (?, ?, ?, ?)",
+                    [(word, language.value, json.dumps(word_synonyms, ensure_ascii=False), expires_at)
+                     for word, word_synonyms in synonyms.items()])
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _remember(self, key: tuple[str, str], expires_at: float, synonyms: list[str]):
+        self._entries[key] = (expires_at, synonyms)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
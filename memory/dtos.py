@@ -2,7 +2,9 @@ from pydantic import BaseModel
 from datetime import datetime
 
 from pydantic import ConfigDict
+from pydantic import Field
 
+from common import HumanResponse
 from common import Language
 
 
@@ -18,6 +20,11 @@ class AssociationDTO(AssociationCreateDTO):
     id: int
 
 
+class AssociationMatchDTO(AssociationDTO):
+    trigger: str
+    similarity: float
+
+
 class ConversationCreateDTO(BaseModel):
     user_name: str
     user_message: str
@@ -25,6 +32,7 @@ class ConversationCreateDTO(BaseModel):
     my_name: str
     emotion: str
     language: Language | None
+    date: datetime = Field(default_factory=datetime.now)
 
 
 class ConversationDTO(ConversationCreateDTO):
@@ -34,6 +42,10 @@ class ConversationDTO(ConversationCreateDTO):
     date: datetime
 
 
+class AssociationVectorDTO(AssociationDTO):
+    vector: list[float]
+
+
 class AttentionWord(BaseModel):
     word: str
     value: float
@@ -41,9 +53,25 @@ class AttentionWord(BaseModel):
 
 class EmbeddingCreateDTO(BaseModel):
     embedding: list[float]
+    # memory.embeddings.content_hash of the embedded sentence, rows without one are never shared
+    content_hash: bytes | None = None
 
 
 class EmbeddingDTO(EmbeddingCreateDTO):
     model_config = ConfigDict(from_attributes=True)
 
     id: int
+
+
+class DateRangeDTO(BaseModel):
+    intent: str
+    start: datetime
+    end: datetime
+
+
+class MemoryTurnDTO(BaseModel):
+    user_name: str
+    message: str
+    emotion: str
+    response: HumanResponse
+    date: datetime = Field(default_factory=datetime.now)
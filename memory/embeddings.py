@@ -0,0 +1,254 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import NamedTuple
+
+import numpy as np
+
+from memory.clients import SentenceEmbeddingInterface
+from memory.tracing import EMBEDDING_CACHE_LOOKUPS
+
+
+def normalize_sentence(sentence: str) -> str:
+    return ' '.join(unicodedata.normalize('NFC', sentence).split())
+
+
+def content_hash(model_name: str, sentence: str) -> bytes:
+    return hashlib.sha256(f'{model_name}\0{normalize_sentence(sentence)}'.encode()).digest()
+
+
+class _PendingEmbedding(NamedTuple):
+    sentences: list[str]
+    future: Future
+
+
+class BatchingSentenceEmbedding(SentenceEmbeddingInterface):
+    def __init__(self, client: SentenceEmbeddingInterface, max_batch_size: int, max_wait_ms: float):
+        """
+        Collects sentences of concurrent callers into a single encode call
+        """
+        self._client = client
+        self.model_name = client.model_name
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._queue: queue.Queue[_PendingEmbedding | None] = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name='sentence-embedding-batcher', daemon=True)
+        self._worker.start()
+
+    def get_sentences_embeddings(self, sentences: list[str]) -> np.ndarray:
+        if not sentences:
+            return self._client.get_sentences_embeddings(sentences)
+
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Sentence embedding batcher is closed")
+            self._queue.put(_PendingEmbedding(sentences, future))
+        return future.result()
+
+    def close(self):
+        """Encodes what was queued before closing, later calls raise instead of waiting for a stopped worker"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join()
+
+        # Nothing should be left behind the stop marker, but a waiting caller must never hang
+        while True:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if pending is not None:
+                pending.future.set_exception(RuntimeError("Sentence embedding batcher is closed"))
+
+    def _run(self):
+        closing = False
+        while not closing:
+            pending = self._queue.get()
+            if pending is None:
+                return
+
+            # Wait a short window for other callers, until the batch is full
+            batch = [pending]
+            size = len(pending.sentences)
+            deadline = time.monotonic() + self._max_wait
+            while size < self._max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if pending is None:
+                    closing = True
+                    break
+                batch.append(pending)
+                size += len(pending.sentences)
+
+            self._encode(batch)
+
+    def _encode(self, batch: list[_PendingEmbedding]):
+        sentences = [sentence for pending in batch for sentence in pending.sentences]
+        try:
+            embeddings = self._client.get_sentences_embeddings(sentences)
+        except Exception as e:
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+
+        # Route rows back to their callers in submission order
+        offset = 0
+        for pending in batch:
+            pending.future.set_result(embeddings[offset:offset + len(pending.sentences)])
+            offset += len(pending.sentences)
+
+
+class EmbeddingDiskStore:
+    def __init__(self, path: str, capacity: int):
+        """
+        Fixed capacity ring of embeddings in a memory-mapped .npy file, survives restarts
+        """
+        self._path = path
+        self._capacity = capacity
+        self._records: np.memmap | None = None
+        self._rows: dict[bytes, int] = {}
+        self._next_row = 0
+        self._sequence = 0
+        if os.path.exists(path):
+            records = np.lib.format.open_memmap(path, mode='r+')
+            # A changed capacity starts over, the file is recreated on the first put
+            if len(records) == capacity:
+                self._open(records)
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        return np.array(self._records['vector'][row])
+
+    def put(self, key: bytes, vector: np.ndarray):
+        if self._records is None or self._records['vector'].shape[1] != vector.shape[0]:
+            self._create(vector.shape[0])
+
+        # Overwrite the oldest row once the ring is full
+        row = self._next_row
+        if self._records['sequence'][row]:
+            self._rows.pop(self._records['key'][row].tobytes(), None)
+
+        self._sequence += 1
+        self._records['sequence'][row] = self._sequence
+        self._records['key'][row] = np.frombuffer(key, dtype=np.uint8)
+        self._records['vector'][row] = vector
+        self._rows[key] = row
+        self._next_row = (row + 1) % len(self._records)
+
+    def flush(self):
+        if self._records is not None:
+            self._records.flush()
+
+    def _create(self, dim: int):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        dtype = np.dtype([('sequence', '<u8'), ('key', 'u1', (32,)), ('vector', '<f4', (dim,))])
+        self._open(np.lib.format.open_memmap(self._path, mode='w+', dtype=dtype, shape=(self._capacity,)))
+
+    def _open(self, records: np.memmap):
+        self._records = records
+        filled = np.flatnonzero(records['sequence'])
+        self._rows = {records['key'][row].tobytes(): int(row) for row in filled}
+        if len(filled):
+            last_row = int(np.argmax(records['sequence']))
+            self._sequence = int(records['sequence'][last_row])
+            self._next_row = (last_row + 1) % len(records)
+        else:
+            self._sequence = 0
+            self._next_row = 0
+
+
+class CachingSentenceEmbedding(SentenceEmbeddingInterface):
+    def __init__(self, client: SentenceEmbeddingInterface, max_size: int, disk_store: EmbeddingDiskStore | None = None):
+        """
+        Bounded in-memory LRU with an optional on-disk tier in front of the embedding model
+        """
+        self._client = client
+        self.model_name = client.model_name
+        self._max_size = max_size
+        self._disk_store = disk_store
+        self._lru: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_sentences_embeddings(self, sentences: list[str]) -> np.ndarray:
+        if not sentences:
+            return self._client.get_sentences_embeddings(sentences)
+
+        keys = [content_hash(self.model_name, sentence) for sentence in sentences]
+        rows: list[np.ndarray | None] = [None] * len(sentences)
+        missing: dict[bytes, list[int]] = {}
+        # Every sentence counts once, a repeated missing sentence is still encoded once
+        lookups = {'memory': 0, 'disk': 0, 'miss': 0}
+        with self._lock:
+            for i, key in enumerate(keys):
+                embedding, result = self._lookup(key)
+                lookups[result] += 1
+                if embedding is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    rows[i] = embedding
+        for result, count in lookups.items():
+            if count:
+                EMBEDDING_CACHE_LOOKUPS.labels(result).inc(count)
+
+        if missing:
+            embeddings = self._client.get_sentences_embeddings(
+                [sentences[positions[0]] for positions in missing.values()])
+            with self._lock:
+                for (key, positions), embedding in zip(missing.items(), embeddings):
+                    self._store(key, embedding)
+                    for i in positions:
+                        rows[i] = embedding
+
+        return np.stack(rows)
+
+    def close(self):
+        with self._lock:
+            if self._disk_store is not None:
+                self._disk_store.flush()
+
+    def _lookup(self, key: bytes) -> tuple[np.ndarray | None, str]:
+        """Returns the embedding with the tier that answered, memory, disk or miss"""
+        embedding = self._lru.get(key)
+        if embedding is not None:
+            self._lru.move_to_end(key)
+            return embedding, 'memory'
+
+        if self._disk_store is not None:
+            embedding = self._disk_store.get(key)
+            if embedding is not None:
+                self._remember(key, embedding)
+                return embedding, 'disk'
+        return None, 'miss'
+
+    def _store(self, key: bytes, embedding: np.ndarray):
+        # Copy the row so the cache does not pin the whole batch array
+        embedding = np.array(embedding, dtype=np.float32)
+        self._remember(key, embedding)
+        if self._disk_store is not None:
+            self._disk_store.put(key, embedding)
+
+    def _remember(self, key: bytes, embedding: np.ndarray):
+        self._lru[key] = embedding
+        self._lru.move_to_end(key)
+        while len(self._lru) > self._max_size:
+            self._lru.popitem(last=False)
@@ -0,0 +1,89 @@
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+from typing import Callable
+
+import numpy as np
+
+from memory.clients import SentenceEmbeddingInterface
+from memory.dtos import DateRangeDTO
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def _today(now: datetime) -> datetime:
+    return datetime.combine(now.date(), time.min)
+
+
+def _yesterday(now: datetime) -> tuple[datetime, datetime]:
+    return _today(now) - timedelta(days=1), _today(now)
+
+
+def _this_day(now: datetime) -> tuple[datetime, datetime]:
+    return _today(now), _today(now) + timedelta(days=1)
+
+
+def _last_week(now: datetime) -> tuple[datetime, datetime]:
+    this_week = _today(now) - timedelta(days=now.weekday())
+    return this_week - timedelta(days=7), this_week
+
+
+def _last_month(now: datetime) -> tuple[datetime, datetime]:
+    this_month = _today(now).replace(day=1)
+    return (this_month - timedelta(days=1)).replace(day=1), this_month
+
+
+def _last_weekday(weekday: int) -> Callable[[datetime], tuple[datetime, datetime]]:
+    # The latest such day before today
+    def resolve(now: datetime) -> tuple[datetime, datetime]:
+        start = _today(now) - timedelta(days=(now.weekday() - weekday - 1) % 7 + 1)
+        return start, start + timedelta(days=1)
+    return resolve
+
+
+RESOLVERS: dict[str, Callable[[datetime], tuple[datetime, datetime]]] = {
+    'today': _this_day,
+    'yesterday': _yesterday,
+    'last_week': _last_week,
+    'last_month': _last_month,
+    **{name: _last_weekday(weekday) for weekday, name in enumerate(WEEKDAYS)},
+}
+
+
+class TemporalIntentDetector:
+    def __init__(self, sentence_embedding: SentenceEmbeddingInterface, intents: dict[str, list[str]],
+                 threshold: float):
+        """
+        Recognizes time references in messages, intent phrases are embedded once
+        """
+        unknown = set(intents) - set(RESOLVERS)
+        if unknown:
+            raise ValueError(f"Unknown temporal intents {sorted(unknown)}, known are {sorted(RESOLVERS)}")
+
+        self._threshold = threshold
+        self._phrase_intents = [intent for intent, phrases in intents.items() for _ in phrases]
+        phrases = [phrase for intent_phrases in intents.values() for phrase in intent_phrases]
+        self._phrases = self._normalize(np.asarray(sentence_embedding.get_sentences_embeddings(phrases))) \
+            if phrases else np.empty((0, 0), dtype=np.float32)
+
+    def detect(self, embeddings: np.ndarray, now: datetime | None = None) -> list[DateRangeDTO]:
+        """Returns date ranges of the intents any sentence refers to, most confident first"""
+        if len(embeddings) == 0 or len(self._phrases) == 0:
+            return []
+
+        # Every sentence against every phrase in one product, best sentence per phrase
+        scores = (self._normalize(np.asarray(embeddings)) @ self._phrases.T).max(axis=0)
+        now = now or datetime.now()
+        date_ranges = {}
+        for phrase_index in np.argsort(-scores):
+            if scores[phrase_index] < self._threshold:
+                break
+            intent = self._phrase_intents[phrase_index]
+            if intent not in date_ranges:
+                start, end = RESOLVERS[intent](now)
+                date_ranges[intent] = DateRangeDTO(intent=intent, start=start, end=end)
+        return list(date_ranges.values())
+
+    def _normalize(self, embeddings: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.where(norms == 0, 1, norms)).astype(np.float32)
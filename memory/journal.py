@@ -0,0 +1,226 @@
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable
+from typing import Protocol
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import OperationalError
+
+from memory.dtos import MemoryTurnDTO
+from memory.settings import MemorySettings
+from memory.tracing import JOURNAL_TURNS
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryJournalInterface(Protocol):
+    def put(self, turn: MemoryTurnDTO):
+        raise NotImplementedError
+
+
+class MemoryJournal(MemoryJournalInterface):
+    def __init__(self, path: str, max_attempts: int):
+        """
+        Durable local queue of chat turns that are not persisted to the memory database yet
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+                                 CREATE TABLE IF NOT EXISTS turns (
+                                     id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                     payload TEXT NOT NULL,
+                                     attempts INTEGER NOT NULL DEFAULT 0,
+                                     created_at REAL NOT NULL
+                                 )
+                                 """)
+        self._on_put: Callable[[], None] | None = None
+
+    def put(self, turn: MemoryTurnDTO):
+        with self._lock:
+            self._connection.execute("INSERT INTO turns (payload, created_at) VALUES (?, ?)",
+                                     (turn.model_dump_json(), time.time()))
+        if self._on_put is not None:
+            self._on_put()
+
+    def take(self, limit: int) -> list[tuple[int, MemoryTurnDTO]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, payload FROM turns WHERE attempts < ? ORDER BY id LIMIT ?",
+                (self._max_attempts, limit)).fetchall()
+        return [(turn_id, MemoryTurnDTO.model_validate_json(payload)) for turn_id, payload in rows]
+
+    def ack(self, turn_ids: list[int]):
+        with self._lock:
+            self._connection.executemany("DELETE FROM turns WHERE id = ?", [(turn_id,) for turn_id in turn_ids])
+
+    def fail(self, turn_ids: list[int]) -> list[int]:
+        """Charges the turns one attempt, returns those that ran out of attempts"""
+        with self._lock:
+            self._connection.executemany("UPDATE turns SET attempts = attempts + 1 WHERE id = ?",
+                                         [(turn_id,) for turn_id in turn_ids])
+            return [turn_id for turn_id, attempts in self._connection.execute(
+                f"SELECT id, attempts FROM turns WHERE id IN ({', '.join('?' * len(turn_ids))})", turn_ids)
+                    if attempts >= self._max_attempts]
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT count(*) FROM turns WHERE attempts < ?",
+                                            (self._max_attempts,)).fetchone()[0]
+
+    def dead(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT count(*) FROM turns WHERE attempts >= ?",
+                                            (self._max_attempts,)).fetchone()[0]
+
+    def replay(self) -> int:
+        """Gives dead turns their attempts back, returns how many will be retried"""
+        with self._lock:
+            replayed = self._connection.execute("UPDATE turns SET attempts = 0 WHERE attempts >= ?",
+                                                (self._max_attempts,)).rowcount
+        if replayed and self._on_put is not None:
+            self._on_put()
+        return replayed
+
+    def subscribe(self, on_put: Callable[[], None]):
+        self._on_put = on_put
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class MemoryWriter:
+    def __init__(self, journal: MemoryJournal,
+                 persist: Callable[[list[MemoryTurnDTO]], None],
+                 batch_size: int,
+                 flush_interval_ms: float,
+                 max_backoff_ms: float):
+        """
+        Background worker that drains the journal in batches into the memory database
+        """
+        self._journal = journal
+        self._persist = persist
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval_ms / 1000
+        self._max_backoff = max_backoff_ms / 1000
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._worker: threading.Thread | None = None
+        journal.subscribe(self._wakeup.set)
+
+    def start(self):
+        self._worker = threading.Thread(target=self._run, name='memory-writer', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        """Flushes what can be persisted, what fails stays pending for the next start"""
+        if self._worker is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._worker.join()
+        self._worker = None
+
+    def _run(self):
+        backoff = 0.0
+        while not self._stopping.is_set():
+            if backoff:
+                # New turns do not cut a backoff short, only stopping does
+                self._stopping.wait(backoff)
+            else:
+                self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            backoff = 0.0 if self._drain() else min(self._max_backoff, max(self._flush_interval, 2 * backoff))
+        self._drain()
+
+    def _drain(self) -> bool:
+        """Persists batches until the journal is empty, returns False on the first failure"""
+        try:
+            while True:
+                batch = self._journal.take(self._batch_size)
+                if not batch:
+                    return True
+
+                try:
+                    self._persist([turn for _, turn in batch])
+                except Exception as e:
+                    if _is_connection_error(e):
+                        raise
+                    logger.exception("Failed to persist %d memory turns", len(batch))
+                    # Turns are retried one by one, so only the failing ones are charged an attempt
+                    failed = [batch[0][0]] if len(batch) == 1 else self._persist_each(batch)
+                    if failed:
+                        self._fail(failed)
+                        return False
+                    continue
+                self._journal.ack([turn_id for turn_id, _ in batch])
+        except Exception as e:
+            if not _is_connection_error(e):
+                raise
+            logger.warning("Memory database is unreachable, turns stay pending", exc_info=True)
+            return False
+        finally:
+            self._report()
+
+    def _persist_each(self, batch: list[tuple[int, MemoryTurnDTO]]) -> list[int]:
+        failed = []
+        for turn_id, turn in batch:
+            try:
+                self._persist([turn])
+            except Exception as e:
+                if _is_connection_error(e):
+                    raise
+                logger.exception("Failed to persist memory turn %d", turn_id)
+                failed.append(turn_id)
+                continue
+            self._journal.ack([turn_id])
+        return failed
+
+    def _fail(self, turn_ids: list[int]):
+        dead = self._journal.fail(turn_ids)
+        if dead:
+            logger.error("Memory turns %s ran out of attempts, they stay in the journal until replayed "
+                         "with python -m memory.journal replay", dead)
+
+    def _report(self):
+        JOURNAL_TURNS.labels('pending').set(self._journal.pending())
+        JOURNAL_TURNS.labels('dead').set(self._journal.dead())
+
+
+def _is_connection_error(error: Exception) -> bool:
+    # The database is not reachable, no turn is to blame for it
+    return isinstance(error, OperationalError) or (isinstance(error, DBAPIError) and error.connection_invalidated)
+
+
+def main():
+    defaults = MemorySettings.model_fields
+    parser = argparse.ArgumentParser(description="Inspects the write-behind journal and replays dead turns")
+    parser.add_argument('command', choices=['status', 'replay'])
+    parser.add_argument('--path', default=defaults['journal_path'].default)
+    parser.add_argument('--max-attempts', type=int, default=defaults['journal_max_attempts'].default)
+    args = parser.parse_args()
+
+    # A running memory writer picks replayed turns up on its next flush interval
+    journal = MemoryJournal(args.path, args.max_attempts)
+    try:
+        if args.command == 'replay':
+            print(f"replayed {journal.replay()} turns")
+        print(f"pending {journal.pending()}, dead {journal.dead()}")
+    finally:
+        journal.close()
+
+
+if __name__ == '__main__':
+    main()
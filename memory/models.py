@@ -1,20 +1,34 @@
 from datetime import datetime
 
+from pgvector.sqlalchemy import BIT
+from pgvector.sqlalchemy import HALFVEC
 from pgvector.sqlalchemy import VECTOR
 from sqlalchemy import Column
 from sqlalchemy import DateTime
 from sqlalchemy import Enum
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy import Integer
+from sqlalchemy import LargeBinary
 from sqlalchemy import String
+from sqlalchemy import cast
+from sqlalchemy import func
+from sqlalchemy import text
 from sqlalchemy.orm import relationship
 
 from common import Language
 from database import Base
 
+EMBEDDING_DIMENSIONS = 768
+EMBEDDING_STORAGES = ('float32', 'halfvec', 'binary')
+
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Shrinks as the consolidation worker goes, it only ever scans what is left
+        Index('ix_conversations_unconsolidated', 'id', postgresql_where=text('consolidated_at IS NULL')),
+    )
 
     language = Column(Enum(Language), nullable=True)
     id = Column(Integer, primary_key=True, index=True)
@@ -23,13 +37,20 @@ class Conversation(Base):
     user_message = Column(String, nullable=False)
     my_name = Column(String, nullable=False)
     my_message = Column(String, nullable=False)
-    date = Column(DateTime, default=datetime.now())
+    date = Column(DateTime, default=datetime.now, index=True)
+    consolidated_at = Column(DateTime, nullable=True)
 
     associations = relationship("Association", back_populates="conversation")
 
 
 class Association(Base):
     __tablename__ = "associations"
+    __table_args__ = (
+        Index('ix_associations_key_trgm', 'key',
+              postgresql_using='gin',
+              postgresql_ops={'key': 'gin_trgm_ops'}),
+        Index('ix_associations_embedding_id_conversation_id', 'embedding_id', 'conversation_id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     key = Column(String, nullable=False)
@@ -42,8 +63,45 @@ class Association(Base):
 
 class Embedding(Base):
     __tablename__ = 'embeddings'
+    __table_args__ = (
+        Index('ix_embeddings_vector_hnsw', 'vector',
+              postgresql_using='hnsw',
+              postgresql_with={'m': 16, 'ef_construction': 64},
+              postgresql_ops={'vector': 'vector_cosine_ops'}),
+    )
 
     id = Column(Integer, primary_key=True)
-    vector = Column(VECTOR(768))
+    # Declared for float32 storage, configure_embedding_storage switches it and its index
+    vector = Column(VECTOR(EMBEDDING_DIMENSIONS))
+    # Same sentence embedded by the same model shares one row
+    content_hash = Column(LargeBinary, nullable=True, unique=True, index=True)
 
     associations = relationship("Association", back_populates="embedding")
+
+
+def configure_embedding_storage(storage: str):
+    """
+    Declares embeddings.vector and its index as the compact embeddings migration stores them,
+    call it once at startup before the first query
+    """
+    if storage not in EMBEDDING_STORAGES:
+        raise ValueError(f"Unknown embedding storage {storage!r}, expected one of {', '.join(EMBEDDING_STORAGES)}")
+
+    table = Embedding.__table__
+    for index in [index for index in table.indexes if index.name.startswith('ix_embeddings_vector_')]:
+        table.indexes.remove(index)
+
+    vector = table.c.vector
+    vector.type = VECTOR(EMBEDDING_DIMENSIONS) if storage == 'float32' else HALFVEC(EMBEDDING_DIMENSIONS)
+    if storage == 'binary':
+        # Must match the expression searched by the repositories to be used
+        Index('ix_embeddings_vector_binary_hnsw',
+              cast(func.binary_quantize(vector), BIT(EMBEDDING_DIMENSIONS)).label('vector_bits'),
+              postgresql_using='hnsw',
+              postgresql_with={'m': 16, 'ef_construction': 64},
+              postgresql_ops={'vector_bits': 'bit_hamming_ops'})
+    else:
+        Index('ix_embeddings_vector_hnsw', vector,
+              postgresql_using='hnsw',
+              postgresql_with={'m': 16, 'ef_construction': 64},
+              postgresql_ops={'vector': 'vector_cosine_ops' if storage == 'float32' else 'halfvec_cosine_ops'})
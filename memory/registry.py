@@ -0,0 +1,120 @@
+import logging
+import threading
+
+from memory.clients import AttentionClientInterface
+from memory.clients import AttentionClientV1
+from memory.clients import AttentionClientV2
+from memory.clients import SentenceEmbeddingInterface
+from memory.clients import SentenceEmbeddingV1
+from memory.clients import SentenceEmbeddingV2
+from memory.embeddings import BatchingSentenceEmbedding
+from memory.embeddings import CachingSentenceEmbedding
+from memory.embeddings import EmbeddingDiskStore
+from memory.intents import TemporalIntentDetector
+from memory.settings import InferenceSettings
+from memory.settings import MemorySettings
+
+logger = logging.getLogger(__name__)
+
+WARMUP_SENTENCES = ['Привет', 'Как прошёл твой день?']
+
+
+class ModelRegistry:
+    def __init__(self, settings: InferenceSettings, memory_settings: MemorySettings):
+        """
+        Loads every inference model once per process and hands out shared instances
+        """
+        self._settings = settings
+        self._memory_settings = memory_settings
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._error: Exception | None = None
+        self._sentence_embedding: SentenceEmbeddingInterface | None = None
+        self._model_embedding: SentenceEmbeddingInterface | None = None
+        self._batching_embedding: BatchingSentenceEmbedding | None = None
+        self._caching_embedding: CachingSentenceEmbedding | None = None
+        self._attention_client: AttentionClientInterface | None = None
+        self._temporal_intent_detector: TemporalIntentDetector | None = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def error(self) -> Exception | None:
+        return self._error
+
+    @property
+    def sentence_embedding(self) -> SentenceEmbeddingInterface:
+        self._ensure_ready()
+        return self._sentence_embedding
+
+    @property
+    def attention_client(self) -> AttentionClientInterface:
+        self._ensure_ready()
+        return self._attention_client
+
+    @property
+    def temporal_intent_detector(self) -> TemporalIntentDetector:
+        self._ensure_ready()
+        return self._temporal_intent_detector
+
+    def load(self):
+        with self._lock:
+            if self._ready.is_set():
+                return
+            try:
+                self._sentence_embedding = self._load_sentence_embedding()
+                self._attention_client = self._load_attention_client()
+                self._temporal_intent_detector = TemporalIntentDetector(
+                    self._sentence_embedding,
+                    self._memory_settings.temporal_intents,
+                    self._memory_settings.temporal_intent_threshold)
+                if self._settings.warmup:
+                    self._warmup()
+            except Exception as e:
+                logger.exception("Model registry failed to load")
+                self._error = e
+                raise
+            self._ready.set()
+
+    def close(self):
+        if self._caching_embedding is not None:
+            self._caching_embedding.close()
+        if self._batching_embedding is not None:
+            self._batching_embedding.close()
+            self._batching_embedding = None
+
+    def _load_sentence_embedding(self) -> SentenceEmbeddingInterface:
+        if self._settings.backend == 'torch':
+            self._model_embedding = SentenceEmbeddingV1(batch_size=self._settings.batch_max_size)
+        else:
+            self._model_embedding = SentenceEmbeddingV2(self._settings.backend,
+                                                        batch_size=self._settings.batch_max_size,
+                                                        onnx_file_name=self._settings.onnx_file_name)
+        sentence_embedding = self._model_embedding
+        if self._settings.batching:
+            self._batching_embedding = BatchingSentenceEmbedding(
+                sentence_embedding, self._settings.batch_max_size, self._settings.batch_max_wait_ms)
+            sentence_embedding = self._batching_embedding
+        if self._settings.cache_size > 0:
+            disk_store = None
+            if self._settings.cache_path:
+                disk_store = EmbeddingDiskStore(self._settings.cache_path, self._settings.cache_disk_capacity)
+            self._caching_embedding = CachingSentenceEmbedding(sentence_embedding, self._settings.cache_size, disk_store)
+            sentence_embedding = self._caching_embedding
+        return sentence_embedding
+
+    def _load_attention_client(self) -> AttentionClientInterface:
+        if self._settings.backend == 'torch':
+            return AttentionClientV1()
+        return AttentionClientV2()
+
+    def _warmup(self):
+        # First forward passes allocate buffers and initialize kernels, pay for it before traffic
+        self._model_embedding.get_sentences_embeddings(WARMUP_SENTENCES)
+        self._attention_client.attention_scores_batch(WARMUP_SENTENCES)
+
+    def _ensure_ready(self):
+        if not self._ready.is_set():
+            raise RuntimeError("Model registry is not loaded yet")
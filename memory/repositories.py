@@ -1,18 +1,29 @@
-import random
 from datetime import date
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
 from typing import Protocol
 
-from sqlalchemy import func
+import numpy as np
+from pgvector import HalfVector
+from sqlalchemy import delete
+from sqlalchemy import select
 from sqlalchemy import text
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import joinedload
 
 from memory.dtos import AssociationCreateDTO
 from memory.dtos import AssociationDTO
+from memory.dtos import AssociationMatchDTO
+from memory.dtos import AssociationVectorDTO
 from memory.dtos import ConversationCreateDTO
 from memory.dtos import ConversationDTO
 from memory.dtos import EmbeddingCreateDTO
 from memory.dtos import EmbeddingDTO
+from memory.models import EMBEDDING_DIMENSIONS
 from memory.models import Association
 from memory.models import Conversation
 from memory.models import Embedding
@@ -28,69 +39,419 @@ class AssociationRepositoryInterface(Protocol):
     def create_embedding(self, create_dto: EmbeddingCreateDTO) -> EmbeddingDTO:
         raise NotImplementedError
 
+    def create_associations_bulk(self, create_dtos: list[AssociationCreateDTO]) -> list[AssociationDTO]:
+        raise NotImplementedError
+
+    def create_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        raise NotImplementedError
+
+    def upsert_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        """Inserts hashed embeddings, a content hash stored before returns the existing embedding"""
+        raise NotImplementedError
+
+    def get_embedding_ids_by_hashes(self, content_hashes: list[bytes]) -> dict[bytes, int]:
+        """Returns ids of the stored embeddings by content hash, unknown hashes are left out"""
+        raise NotImplementedError
+
     def get_conversation_by_id(self, conversation_id: int) -> ConversationDTO:
         raise NotImplementedError
 
+    def get_conversations_by_ids(self, conversation_ids: list[int]) -> list[ConversationDTO]:
+        """Returns conversations in the order of the ids, unknown ids are left out"""
+        raise NotImplementedError
+
     def get_by_key(self, key: str, similarity_threshold: float) -> list[AssociationDTO]:
         raise NotImplementedError
 
+    def get_by_keys(self, keys: list[str], similarity_threshold: float) -> list[AssociationMatchDTO]:
+        """Returns associations similar to any of the keys with the key they matched, most similar first"""
+        raise NotImplementedError
+
     def get_similar_embedding(self, embedding: str, top_n: int, similarity_threshold: float) -> list[ConversationDTO]:
         raise NotImplementedError
 
+    def get_similar_conversations(self, embeddings: np.ndarray, top_n: int,
+                                  similarity_threshold: float) -> list[ConversationDTO]:
+        """Returns conversations near any of the embeddings, deduplicated, ordered by embedding then distance"""
+        raise NotImplementedError
+
     def get_random_by_date(self, conversation_date: date, limit: int) -> list[ConversationDTO]:
         raise NotImplementedError
 
-class AssociationRepositoryV1(AssociationRepositoryInterface):
-    def __init__(self, session: Session):
+    def get_random_by_range(self, start: datetime, end: datetime, limit: int) -> list[ConversationDTO]:
+        """Returns up to limit random conversations with start <= date < end"""
+        raise NotImplementedError
+
+
+class AsyncAssociationRepositoryInterface(Protocol):
+    async def create_association(self, create_dto: AssociationCreateDTO) -> AssociationDTO:
+        raise NotImplementedError
+
+    async def create_conversation(self, create_dto: ConversationCreateDTO) -> ConversationDTO:
+        raise NotImplementedError
+
+    async def create_embedding(self, create_dto: EmbeddingCreateDTO) -> EmbeddingDTO:
+        raise NotImplementedError
+
+    async def create_associations_bulk(self, create_dtos: list[AssociationCreateDTO]) -> list[AssociationDTO]:
+        raise NotImplementedError
+
+    async def create_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        raise NotImplementedError
+
+    async def upsert_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        """Inserts hashed embeddings, a content hash stored before returns the existing embedding"""
+        raise NotImplementedError
+
+    async def get_embedding_ids_by_hashes(self, content_hashes: list[bytes]) -> dict[bytes, int]:
+        """Returns ids of the stored embeddings by content hash, unknown hashes are left out"""
+        raise NotImplementedError
+
+    async def get_conversation_by_id(self, conversation_id: int) -> ConversationDTO:
+        raise NotImplementedError
+
+    async def get_conversations_by_ids(self, conversation_ids: list[int]) -> list[ConversationDTO]:
+        """Returns conversations in the order of the ids, unknown ids are left out"""
+        raise NotImplementedError
+
+    async def get_by_key(self, key: str, similarity_threshold: float) -> list[AssociationDTO]:
+        raise NotImplementedError
+
+    async def get_by_keys(self, keys: list[str], similarity_threshold: float) -> list[AssociationMatchDTO]:
+        """Returns associations similar to any of the keys with the key they matched, most similar first"""
+        raise NotImplementedError
+
+    async def get_similar_embedding(self, embedding: str, top_n: int,
+                                    similarity_threshold: float) -> list[ConversationDTO]:
+        raise NotImplementedError
+
+    async def get_similar_conversations(self, embeddings: np.ndarray, top_n: int,
+                                        similarity_threshold: float) -> list[ConversationDTO]:
+        """Returns conversations near any of the embeddings, deduplicated, ordered by embedding then distance"""
+        raise NotImplementedError
+
+    async def get_random_by_date(self, conversation_date: date, limit: int) -> list[ConversationDTO]:
+        raise NotImplementedError
+
+    async def get_random_by_range(self, start: datetime, end: datetime, limit: int) -> list[ConversationDTO]:
+        """Returns up to limit random conversations with start <= date < end"""
+        raise NotImplementedError
+
+
+class ConsolidationRepositoryInterface(AssociationRepositoryInterface, Protocol):
+    def get_consolidation_candidates(self, before: datetime, limit: int) -> list[ConversationDTO]:
+        """Returns the oldest conversations dated before that were not consolidated yet"""
+        raise NotImplementedError
+
+    def lock_for_consolidation(self, conversation_ids: list[int]) -> list[int]:
+        """Locks the conversations still to consolidate until the end of the transaction, skips locked ones"""
+        raise NotImplementedError
+
+    def get_association_vectors(self, conversation_ids: list[int]) -> list[AssociationVectorDTO]:
+        raise NotImplementedError
+
+    def delete_associations(self, association_ids: list[int]):
+        raise NotImplementedError
+
+    def delete_orphan_embeddings(self, embedding_ids: list[int]) -> int:
+        """Deletes the embeddings no association points at anymore, returns how many"""
+        raise NotImplementedError
+
+    def mark_consolidated(self, conversation_ids: list[int], consolidated_at: datetime):
+        raise NotImplementedError
+
+
+class _AssociationRepositoryBase:
+    """Statements shared by the sync and async repositories"""
+
+    def __init__(self, ef_search: int | None = None, vector_storage: str = "float32", rerank_factor: int = 4):
+        self._ef_search = ef_search
+        self._vector_storage = vector_storage
+        self._rerank_factor = rerank_factor
+
+    def _by_keys_statement(self):
+        # The % operator is served by the gin_trgm_ops index, one index probe per key
+        return text("""
+                    SELECT a.id, a.key, a.conversation_id, a.embedding_id, t.trigger,
+                           similarity(a.key, t.trigger) AS similarity
+                    FROM unnest(CAST(:keys AS text[])) AS t(trigger)
+                    CROSS JOIN LATERAL (
+                        SELECT * FROM associations WHERE associations.key % t.trigger
+                    ) a
+                    ORDER BY similarity DESC, a.id
+                    """)
+
+    def _similarity_threshold_statement(self, similarity_threshold: float):
+        # Same as set_limit(), but transaction local so pooled connections keep their defaults
+        return (text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)"),
+                {"threshold": str(similarity_threshold)})
+
+    def _similar_embedding_statement(self):
+        return text(f"""
+                    SELECT n.id, n.distance
+                    FROM (SELECT CAST(:embedding AS {self._vector_type()}) AS embedding) query
+                    CROSS JOIN LATERAL ({self._nearest_embeddings_sql("query.embedding")}) n
+                    """)
+
+    def _nearest_embeddings_sql(self, embedding: str) -> str:
+        # Cosine distance <=> on the hnsw index of the storage mode, binary mode shortlists
+        # candidates by hamming distance on the bit index and reranks them on the stored vectors
+        if self._vector_storage != "binary":
+            return f"""
+                    SELECT e.id, e.vector <=> {embedding} AS distance
+                    FROM embeddings e
+                    ORDER BY e.vector <=> {embedding} LIMIT :top_n
+                    """
+        bits = f"bit({EMBEDDING_DIMENSIONS})"
+        return f"""
+                    SELECT c.id, c.vector <=> {embedding} AS distance
+                    FROM (
+                        SELECT e.id, e.vector
+                        FROM embeddings e
+                        ORDER BY CAST(binary_quantize(e.vector) AS {bits}) <~> CAST(binary_quantize({embedding}) AS {bits})
+                        LIMIT :candidates
+                    ) c
+                    ORDER BY distance LIMIT :top_n
+                    """
+
+    def _nearest_embeddings_params(self, top_n: int) -> dict:
+        return {"top_n": top_n, "candidates": self._candidates(top_n)}
+
+    def _candidates(self, top_n: int) -> int:
+        return top_n * self._rerank_factor if self._vector_storage == "binary" else top_n
+
+    def _vector_type(self) -> str:
+        return "vector" if self._vector_storage == "float32" else f"halfvec({EMBEDDING_DIMENSIONS})"
+
+    def _associations_with_conversation_statement(self, embedding_ids: list[int]):
+        stmt = select(Association).options(joinedload(Association.conversation))
+        return stmt.filter(Association.embedding_id.in_(embedding_ids))
+
+    def _similar_conversations_statement(self):
+        # One statement: a lateral index scan per query vector, joined to conversations,
+        # a shared embedding contributes its top_n latest conversations,
+        # each conversation kept once for the first sentence that found it
+        return select(Conversation).from_statement(text(f"""
+                    WITH queries AS (
+                        SELECT q.query_index, CAST(q.embedding AS {self._vector_type()}) AS embedding
+                        FROM unnest(CAST(:embeddings AS text[])) WITH ORDINALITY AS q(embedding, query_index)
+                    ), neighbours AS (
+                        SELECT queries.query_index, n.id AS embedding_id, n.distance
+                        FROM queries
+                        CROSS JOIN LATERAL ({self._nearest_embeddings_sql("queries.embedding")}) n
+                        WHERE 1.0 - n.distance >= :similarity_threshold
+                    ), matches AS (
+                        SELECT DISTINCT ON (c.id) c.*, neighbours.query_index, neighbours.distance
+                        FROM neighbours
+                        CROSS JOIN LATERAL (
+                            SELECT a.conversation_id
+                            FROM associations a
+                            WHERE a.embedding_id = neighbours.embedding_id
+                            ORDER BY a.conversation_id DESC LIMIT :top_n
+                        ) a
+                        JOIN conversations c ON c.id = a.conversation_id
+                        ORDER BY c.id, neighbours.query_index, neighbours.distance
+                    )
+                    SELECT * FROM matches ORDER BY query_index, distance
+                    """))
+
+    def _similar_conversations_params(self, embeddings: np.ndarray, top_n: int,
+                                      similarity_threshold: float) -> dict:
+        return {"embeddings": [self._to_vector_literal(embedding) for embedding in embeddings],
+                "similarity_threshold": similarity_threshold,
+                **self._nearest_embeddings_params(top_n)}
+
+    def _random_by_range_statement(self):
+        # One statement: random ids between the first and last id of the range are probed on the
+        # primary key, each probe takes the next conversation in range, the date index bounds the range
+        return select(Conversation).from_statement(text("""
+                    WITH bounds AS (
+                        SELECT min(id) AS low, max(id) AS high
+                        FROM conversations
+                        WHERE date >= :start AND date < :end
+                    ), probes AS (
+                        SELECT DISTINCT bounds.low + floor(random() * (bounds.high - bounds.low + 1))::int AS probe_id
+                        FROM bounds, generate_series(1, :probes)
+                        WHERE bounds.low IS NOT NULL
+                    ), samples AS (
+                        SELECT DISTINCT ON (c.id) c.*
+                        FROM probes
+                        CROSS JOIN LATERAL (
+                            SELECT * FROM conversations
+                            WHERE id >= probes.probe_id AND date >= :start AND date < :end
+                            ORDER BY id LIMIT 1
+                        ) c
+                        ORDER BY c.id
+                    )
+                    SELECT * FROM samples ORDER BY random() LIMIT :limit
+                    """))
+
+    def _random_by_range_params(self, start: datetime, end: datetime, limit: int) -> dict:
+        # Probes landing on the same conversation are merged, oversample to still fill the limit
+        return {"start": start, "end": end, "limit": limit, "probes": limit * 4}
+
+    def _day_range(self, conversation_date: date) -> tuple[datetime, datetime]:
+        start = datetime.combine(conversation_date, time.min)
+        return start, start + timedelta(days=1)
+
+    def _ef_search_for(self, top_n: int) -> int | None:
+        # The index scan returns at most ef_search rows, the binary shortlist must fit in it
+        if self._vector_storage != "binary":
+            return self._ef_search
+        return max(self._ef_search or 0, self._candidates(top_n))
+
+    def _ef_search_statement(self, ef_search: int):
+        # Transaction local, so pooled connections keep their defaults
+        return text("SELECT set_config('hnsw.ef_search', :ef_search, true)"), {"ef_search": str(ef_search)}
+
+    def _associations_bulk_statement(self, create_dtos: list[AssociationCreateDTO]):
+        # RETURNING order is not guaranteed for a multi-row insert, ids are drawn per input ordinal
+        # before inserting and read back in ordinal order instead
+        return text("""
+                    WITH rows AS MATERIALIZED (
+                        SELECT nextval(pg_get_serial_sequence('associations', 'id')) AS id, t.*
+                        FROM unnest(CAST(:keys AS text[]), CAST(:conversation_ids AS integer[]),
+                                    CAST(:embedding_ids AS integer[]))
+                             WITH ORDINALITY AS t(key, conversation_id, embedding_id, ordinal)
+                    ), inserted AS (
+                        INSERT INTO associations (id, key, conversation_id, embedding_id)
+                        SELECT id, key, conversation_id, embedding_id FROM rows
+                    )
+                    SELECT id FROM rows ORDER BY ordinal
+                    """), {"keys": [dto.key for dto in create_dtos],
+                           "conversation_ids": [dto.conversation_id for dto in create_dtos],
+                           "embedding_ids": [dto.embedding_id for dto in create_dtos]}
+
+    def _embeddings_bulk_statement(self, create_dtos: list[EmbeddingCreateDTO]):
+        return text(f"""
+                    WITH rows AS MATERIALIZED (
+                        SELECT nextval(pg_get_serial_sequence('embeddings', 'id')) AS id, t.vector, t.ordinal
+                        FROM unnest(CAST(:vectors AS text[])) WITH ORDINALITY AS t(vector, ordinal)
+                    ), inserted AS (
+                        INSERT INTO embeddings (id, vector)
+                        SELECT id, CAST(vector AS {self._vector_type()}) FROM rows
+                    )
+                    SELECT id FROM rows ORDER BY ordinal
+                    """), {"vectors": [self._to_vector_literal(dto.embedding) for dto in create_dtos]}
+
+    def _conversations_by_ids_statement(self, conversation_ids: list[int]):
+        return select(Conversation).filter(Conversation.id.in_(conversation_ids))
+
+    def _in_ids_order(self, conversations, conversation_ids: list[int]) -> list[ConversationDTO]:
+        by_id = {conversation.id: conversation for conversation in conversations}
+        return [ConversationDTO.model_validate(by_id[conversation_id])
+                for conversation_id in conversation_ids if conversation_id in by_id]
+
+    def _upsert_embeddings_bulk_statement(self, create_dtos: list[EmbeddingCreateDTO]):
+        # Rows of a hash stored by a concurrent writer are skipped and not returned
+        return (postgresql_insert(Embedding)
+                .values([{"vector": dto.embedding, "content_hash": dto.content_hash} for dto in create_dtos])
+                .on_conflict_do_nothing(index_elements=[Embedding.content_hash])
+                .returning(Embedding.id, Embedding.content_hash))
+
+    def _embedding_ids_by_hashes_statement(self, content_hashes: list[bytes]):
+        return select(Embedding.id, Embedding.content_hash).filter(Embedding.content_hash.in_(content_hashes))
+
+    def _to_upserted_embedding_dtos(self, embedding_ids: dict[bytes, int],
+                                    create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        return [EmbeddingDTO(id=embedding_ids[dto.content_hash], **dto.model_dump()) for dto in create_dtos]
+
+    def _to_association_dtos(self, ids: list[int], create_dtos: list[AssociationCreateDTO]) -> list[AssociationDTO]:
+        return [AssociationDTO(id=association_id, **dto.model_dump()) for association_id, dto in zip(ids, create_dtos)]
+
+    def _to_embedding_dtos(self, ids: list[int], create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        return [EmbeddingDTO(id=embedding_id, embedding=dto.embedding) for embedding_id, dto in zip(ids, create_dtos)]
+
+    def _to_vector_literal(self, embedding) -> str:
+        return f"[{', '.join(map(str, embedding))}]"
+
+    def _to_floats(self, vector) -> list[float]:
+        # Columns declared as halfvec read back as HalfVector, vector ones as numpy arrays
+        if isinstance(vector, HalfVector):
+            return vector.to_list()
+        return [float(value) for value in vector]
+
+
+class AssociationRepositoryV1(_AssociationRepositoryBase, AssociationRepositoryInterface):
+    def __init__(self, session: Session, ef_search: int | None = None, vector_storage: str = "float32",
+                 rerank_factor: int = 4):
+        super().__init__(ef_search, vector_storage, rerank_factor)
         self._session = session
 
     def create_association(self, create_dto: AssociationCreateDTO) -> AssociationDTO:
         association = Association(**create_dto.model_dump())
-        self._session.add(association)
-        self._session.commit()
-        self._session.refresh(association)
+        self._save(association)
         return AssociationDTO.model_validate(association)
 
     def create_embedding(self, create_dto: EmbeddingCreateDTO) -> EmbeddingDTO:
         embedding = Embedding(vector=create_dto.embedding)
-        self._session.add(embedding)
-        self._session.commit()
-        self._session.refresh(embedding)
-        return EmbeddingDTO(id=embedding.id, embedding=embedding.vector)
+        self._save(embedding)
+        return EmbeddingDTO(id=embedding.id, embedding=self._to_floats(embedding.vector))
 
     def create_conversation(self, create_dto: ConversationCreateDTO) -> ConversationDTO:
         conversation = Conversation(**create_dto.model_dump())
-        self._session.add(conversation)
-        self._session.commit()
-        self._session.refresh(conversation)
+        self._save(conversation)
         return ConversationDTO.model_validate(conversation)
 
+    def create_associations_bulk(self, create_dtos: list[AssociationCreateDTO]) -> list[AssociationDTO]:
+        if not create_dtos:
+            return []
+        ids = self._insert_returning_ids(*self._associations_bulk_statement(create_dtos))
+        return self._to_association_dtos(ids, create_dtos)
+
+    def create_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        if not create_dtos:
+            return []
+        ids = self._insert_returning_ids(*self._embeddings_bulk_statement(create_dtos))
+        return self._to_embedding_dtos(ids, create_dtos)
+
+    def upsert_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        if not create_dtos:
+            return []
+        rows = self._session.execute(self._upsert_embeddings_bulk_statement(create_dtos)).fetchall()
+        embedding_ids = {row.content_hash: row.id for row in rows}
+        conflicts = [dto.content_hash for dto in create_dtos if dto.content_hash not in embedding_ids]
+        if conflicts:
+            embedding_ids.update(self.get_embedding_ids_by_hashes(conflicts))
+        if not self._in_unit_of_work():
+            self._session.commit()
+        return self._to_upserted_embedding_dtos(embedding_ids, create_dtos)
+
+    def get_embedding_ids_by_hashes(self, content_hashes: list[bytes]) -> dict[bytes, int]:
+        if not content_hashes:
+            return {}
+        rows = self._session.execute(self._embedding_ids_by_hashes_statement(content_hashes)).fetchall()
+        return {row.content_hash: row.id for row in rows}
+
     def get_conversation_by_id(self, conversation_id: int) -> ConversationDTO:
         return ConversationDTO.model_validate(self._session.get(Conversation, conversation_id))
 
+    def get_conversations_by_ids(self, conversation_ids: list[int]) -> list[ConversationDTO]:
+        if not conversation_ids:
+            return []
+        conversations = self._session.execute(self._conversations_by_ids_statement(conversation_ids)).scalars().all()
+        return self._in_ids_order(conversations, conversation_ids)
+
     def get_by_key(self, key: str, similarity_threshold: float) -> list[AssociationDTO]:
-        q = self._session.query(Association, func.similarity(Association.key, key).label("sim"))
-        q = q.filter(func.similarity(Association.key, key) >= similarity_threshold)
-        q = q.order_by(func.similarity(Association.key, key).desc())
-        results = []
-        for association, sim in q.all():  # unpack tuple
-            results.append(AssociationDTO.model_validate(association))
-        return results
+        return [AssociationDTO(**match.model_dump(exclude={"trigger", "similarity"}))
+                for match in self.get_by_keys([key], similarity_threshold)]
 
-    def get_similar_embedding(self, embedding: str, top_n: int, similarity_threshold: float) -> list[ConversationDTO]:
-        # Prepare vector string for pgvector input
-        embedding_str = f"[{', '.join(map(str, embedding))}]"
+    def get_by_keys(self, keys: list[str], similarity_threshold: float) -> list[AssociationMatchDTO]:
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return []
 
-        # Raw SQL with cosine distance <#>
-        sql = text("""
-                   SELECT id, vector, vector <#> :embedding AS distance
-                   FROM embeddings
-                   ORDER BY distance ASC LIMIT :top_n
-                   """)
+        self._session.execute(*self._similarity_threshold_statement(similarity_threshold))
+        rows = self._session.execute(self._by_keys_statement(), {"keys": keys}).fetchall()
+        return [AssociationMatchDTO(**row._mapping) for row in rows]
+
+    def get_similar_embedding(self, embedding: str, top_n: int, similarity_threshold: float) -> list[ConversationDTO]:
+        self._set_ef_search(top_n)
 
         # Execute and fetch embeddings with similarity scores
         results = self._session.execute(
-            sql, {"embedding": embedding_str, "top_n": top_n}
+            self._similar_embedding_statement(),
+            {"embedding": self._to_vector_literal(embedding), **self._nearest_embeddings_params(top_n)}
         ).fetchall()
 
         # Filter by similarity threshold (cosine similarity = 1 - distance)
@@ -100,23 +461,259 @@ class AssociationRepositoryV1(AssociationRepositoryInterface):
             return []
 
         # Fetch Associations + Conversations via ORM
-        q = self._session.query(Association)
-        q = q.options(joinedload(Association.conversation))
-        q = q.filter(Association.embedding_id.in_(valid_ids))
-        associations = q.all()
+        associations = self._session.execute(
+            self._associations_with_conversation_statement(valid_ids)).unique().scalars().all()
 
         # Map to DTOs
         return [ConversationDTO.model_validate(association.conversation) for association in associations]
 
+    def get_similar_conversations(self, embeddings: np.ndarray, top_n: int,
+                                  similarity_threshold: float) -> list[ConversationDTO]:
+        if len(embeddings) == 0:
+            return []
+
+        self._set_ef_search(top_n)
+        conversations = self._session.execute(
+            self._similar_conversations_statement(),
+            self._similar_conversations_params(embeddings, top_n, similarity_threshold)).scalars().all()
+        return [ConversationDTO.model_validate(conversation) for conversation in conversations]
+
     def get_random_by_date(self, conversation_date: date, limit: int) -> list[ConversationDTO]:
-        query = self._session.query(Conversation)
-        if conversation_date:
-            query = query.filter(func.date(Conversation.date) == conversation_date)
+        return self.get_random_by_range(*self._day_range(conversation_date), limit)
 
-        total = query.count()
-        if total == 0:
+    def get_random_by_range(self, start: datetime, end: datetime, limit: int) -> list[ConversationDTO]:
+        if limit <= 0:
             return []
 
-        random_indices = random.sample(range(total), min(limit, total))
-        conversations = [query.offset(idx).first() for idx in random_indices]
-        return [ConversationDTO.model_validate(c) for c in conversations]
\ No newline at end of file
+        conversations = self._session.execute(
+            self._random_by_range_statement(), self._random_by_range_params(start, end, limit)).scalars().all()
+        return [ConversationDTO.model_validate(c) for c in conversations]
+
+    def _save(self, instance):
+        self._session.add(instance)
+        if self._in_unit_of_work():
+            self._session.flush()
+        else:
+            self._session.commit()
+            self._session.refresh(instance)
+
+    def _insert_returning_ids(self, stmt, params: dict) -> list[int]:
+        ids = self._session.execute(stmt, params).scalars().all()
+        if not self._in_unit_of_work():
+            self._session.commit()
+        return ids
+
+    def _in_unit_of_work(self) -> bool:
+        return self._session.info.get('unit_of_work', False)
+
+    def _set_ef_search(self, top_n: int):
+        ef_search = self._ef_search_for(top_n)
+        if ef_search:
+            self._session.execute(*self._ef_search_statement(ef_search))
+
+
+class AsyncAssociationRepositoryV1(_AssociationRepositoryBase, AsyncAssociationRepositoryInterface):
+    def __init__(self, session: AsyncSession, ef_search: int | None = None, vector_storage: str = "float32",
+                 rerank_factor: int = 4):
+        super().__init__(ef_search, vector_storage, rerank_factor)
+        self._session = session
+
+    async def create_association(self, create_dto: AssociationCreateDTO) -> AssociationDTO:
+        association = Association(**create_dto.model_dump())
+        await self._save(association)
+        return AssociationDTO.model_validate(association)
+
+    async def create_embedding(self, create_dto: EmbeddingCreateDTO) -> EmbeddingDTO:
+        embedding = Embedding(vector=create_dto.embedding)
+        await self._save(embedding)
+        return EmbeddingDTO(id=embedding.id, embedding=self._to_floats(embedding.vector))
+
+    async def create_conversation(self, create_dto: ConversationCreateDTO) -> ConversationDTO:
+        conversation = Conversation(**create_dto.model_dump())
+        await self._save(conversation)
+        return ConversationDTO.model_validate(conversation)
+
+    async def create_associations_bulk(self, create_dtos: list[AssociationCreateDTO]) -> list[AssociationDTO]:
+        if not create_dtos:
+            return []
+        ids = await self._insert_returning_ids(*self._associations_bulk_statement(create_dtos))
+        return self._to_association_dtos(ids, create_dtos)
+
+    async def create_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        if not create_dtos:
+            return []
+        ids = await self._insert_returning_ids(*self._embeddings_bulk_statement(create_dtos))
+        return self._to_embedding_dtos(ids, create_dtos)
+
+    async def upsert_embeddings_bulk(self, create_dtos: list[EmbeddingCreateDTO]) -> list[EmbeddingDTO]:
+        if not create_dtos:
+            return []
+        result = await self._session.execute(self._upsert_embeddings_bulk_statement(create_dtos))
+        embedding_ids = {row.content_hash: row.id for row in result.fetchall()}
+        conflicts = [dto.content_hash for dto in create_dtos if dto.content_hash not in embedding_ids]
+        if conflicts:
+            embedding_ids.update(await self.get_embedding_ids_by_hashes(conflicts))
+        if not self._in_unit_of_work():
+            await self._session.commit()
+        return self._to_upserted_embedding_dtos(embedding_ids, create_dtos)
+
+    async def get_embedding_ids_by_hashes(self, content_hashes: list[bytes]) -> dict[bytes, int]:
+        if not content_hashes:
+            return {}
+        result = await self._session.execute(self._embedding_ids_by_hashes_statement(content_hashes))
+        return {row.content_hash: row.id for row in result.fetchall()}
+
+    async def get_conversation_by_id(self, conversation_id: int) -> ConversationDTO:
+        return ConversationDTO.model_validate(await self._session.get(Conversation, conversation_id))
+
+    async def get_conversations_by_ids(self, conversation_ids: list[int]) -> list[ConversationDTO]:
+        if not conversation_ids:
+            return []
+        result = await self._session.execute(self._conversations_by_ids_statement(conversation_ids))
+        return self._in_ids_order(result.scalars().all(), conversation_ids)
+
+    async def get_by_key(self, key: str, similarity_threshold: float) -> list[AssociationDTO]:
+        return [AssociationDTO(**match.model_dump(exclude={"trigger", "similarity"}))
+                for match in await self.get_by_keys([key], similarity_threshold)]
+
+    async def get_by_keys(self, keys: list[str], similarity_threshold: float) -> list[AssociationMatchDTO]:
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return []
+
+        await self._session.execute(*self._similarity_threshold_statement(similarity_threshold))
+        result = await self._session.execute(self._by_keys_statement(), {"keys": keys})
+        return [AssociationMatchDTO(**row._mapping) for row in result.fetchall()]
+
+    async def get_similar_embedding(self, embedding: str, top_n: int,
+                                    similarity_threshold: float) -> list[ConversationDTO]:
+        await self._set_ef_search(top_n)
+        result = await self._session.execute(
+            self._similar_embedding_statement(),
+            {"embedding": self._to_vector_literal(embedding), **self._nearest_embeddings_params(top_n)})
+        valid_ids = [row.id for row in result.fetchall() if (1.0 - row.distance) >= similarity_threshold]
+
+        if not valid_ids:
+            return []
+
+        result = await self._session.execute(self._associations_with_conversation_statement(valid_ids))
+        return [ConversationDTO.model_validate(association.conversation)
+                for association in result.unique().scalars().all()]
+
+    async def get_similar_conversations(self, embeddings: np.ndarray, top_n: int,
+                                        similarity_threshold: float) -> list[ConversationDTO]:
+        if len(embeddings) == 0:
+            return []
+
+        await self._set_ef_search(top_n)
+        result = await self._session.execute(
+            self._similar_conversations_statement(),
+            self._similar_conversations_params(embeddings, top_n, similarity_threshold))
+        return [ConversationDTO.model_validate(conversation) for conversation in result.scalars().all()]
+
+    async def get_random_by_date(self, conversation_date: date, limit: int) -> list[ConversationDTO]:
+        return await self.get_random_by_range(*self._day_range(conversation_date), limit)
+
+    async def get_random_by_range(self, start: datetime, end: datetime, limit: int) -> list[ConversationDTO]:
+        if limit <= 0:
+            return []
+
+        result = await self._session.execute(
+            self._random_by_range_statement(), self._random_by_range_params(start, end, limit))
+        return [ConversationDTO.model_validate(c) for c in result.scalars().all()]
+
+    async def _save(self, instance):
+        self._session.add(instance)
+        if self._in_unit_of_work():
+            await self._session.flush()
+        else:
+            await self._session.commit()
+            await self._session.refresh(instance)
+
+    async def _insert_returning_ids(self, stmt, params: dict) -> list[int]:
+        ids = (await self._session.execute(stmt, params)).scalars().all()
+        if not self._in_unit_of_work():
+            await self._session.commit()
+        return ids
+
+    def _in_unit_of_work(self) -> bool:
+        return self._session.sync_session.info.get('unit_of_work', False)
+
+    async def _set_ef_search(self, top_n: int):
+        ef_search = self._ef_search_for(top_n)
+        if ef_search:
+            await self._session.execute(*self._ef_search_statement(ef_search))
+
+
+class ConsolidationRepositoryV1(AssociationRepositoryV1, ConsolidationRepositoryInterface):
+    def get_consolidation_candidates(self, before: datetime, limit: int) -> list[ConversationDTO]:
+        conversations = self._session.execute(
+            select(Conversation)
+            .filter(Conversation.consolidated_at.is_(None), Conversation.date < before)
+            .order_by(Conversation.id)
+            .limit(limit)).scalars().all()
+        return [ConversationDTO.model_validate(conversation) for conversation in conversations]
+
+    def lock_for_consolidation(self, conversation_ids: list[int]) -> list[int]:
+        if not conversation_ids:
+            return []
+        # Workers of other processes skip the rows this one holds instead of waiting for them
+        return self._session.execute(
+            select(Conversation.id)
+            .filter(Conversation.id.in_(conversation_ids), Conversation.consolidated_at.is_(None))
+            .with_for_update(skip_locked=True)).scalars().all()
+
+    def get_association_vectors(self, conversation_ids: list[int]) -> list[AssociationVectorDTO]:
+        if not conversation_ids:
+            return []
+        rows = self._session.execute(
+            select(Association.id, Association.key, Association.conversation_id, Association.embedding_id,
+                   Embedding.vector)
+            .join(Embedding, Embedding.id == Association.embedding_id)
+            .filter(Association.conversation_id.in_(conversation_ids))
+            .order_by(Association.id)).fetchall()
+        return [AssociationVectorDTO(id=row.id, key=row.key, conversation_id=row.conversation_id,
+                                     embedding_id=row.embedding_id, vector=self._to_floats(row.vector))
+                for row in rows]
+
+    def delete_associations(self, association_ids: list[int]):
+        if association_ids:
+            self._session.execute(delete(Association)
+                                  .filter(Association.id.in_(association_ids))
+                                  .execution_options(synchronize_session=False))
+
+    def delete_orphan_embeddings(self, embedding_ids: list[int]) -> int:
+        if not embedding_ids:
+            return 0
+        # Embeddings shared by content hash stay while another association still uses them
+        referenced = select(Association.id).filter(Association.embedding_id == Embedding.id).exists()
+        result = self._session.execute(
+            delete(Embedding).filter(Embedding.id.in_(embedding_ids), ~referenced).execution_options(
+                synchronize_session=False))
+        return result.rowcount
+
+    def mark_consolidated(self, conversation_ids: list[int], consolidated_at: datetime):
+        if conversation_ids:
+            self._session.execute(update(Conversation)
+                                  .filter(Conversation.id.in_(conversation_ids))
+                                  .values(consolidated_at=consolidated_at)
+                                  .execution_options(synchronize_session=False))
+
+
+def check_embedding_storage(session: Session, storage: str):
+    """Fails when the embeddings table is not stored as configured, see the compact embeddings migration"""
+    row = session.execute(text("""
+                               SELECT format_type(a.atttypid, a.atttypmod) AS vector_type,
+                                      EXISTS (SELECT 1 FROM pg_indexes
+                                              WHERE tablename = 'embeddings'
+                                                AND indexname = 'ix_embeddings_vector_binary_hnsw') AS binary_index
+                               FROM pg_attribute a
+                               WHERE a.attrelid = 'embeddings'::regclass AND a.attname = 'vector'
+                               """)).one()
+    if row.vector_type.startswith('halfvec'):
+        stored = 'binary' if row.binary_index else 'halfvec'
+    else:
+        stored = 'float32'
+    if stored != storage:
+        raise RuntimeError(f"Embeddings are stored as {stored} ({row.vector_type}) but memory__embedding_storage "
+                           f"is {storage}, migrate with alembic -x embedding_storage={storage} or change the setting")
@@ -1,23 +1,40 @@
+import asyncio
 import re
-from datetime import datetime
-from datetime import timedelta
-from difflib import SequenceMatcher
+from typing import AsyncIterator
 from typing import Protocol
 
+import anyio
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from common import HumanResponse
+from database.uows import AsyncUnitOfWorkInterface
+from database.uows import UnitOfWorkInterface
+from memory.clients import AsyncDictionaryClientInterface
+from memory.clients import AsyncGptClientInterface
 from memory.clients import AttentionClientInterface
 from memory.clients import DictionaryClientInterface
 from memory.clients import GptClientInterface
 from memory.clients import SentenceEmbeddingInterface
+from memory.context import ContextBuilder
+from memory.dedupe import MinHashDeduplicator
+from memory.intents import TemporalIntentDetector
 from memory.converters import to_association_create_dto
 from memory.converters import to_conversation_create_dto
 from memory.converters import to_embedding_create_dto
+from memory.dtos import AssociationDTO
+from memory.dtos import AttentionWord
 from memory.dtos import ConversationDTO
+from memory.dtos import MemoryTurnDTO
+from memory.embeddings import content_hash
+from memory.journal import MemoryJournalInterface
 from memory.repositories import AssociationRepositoryInterface
+from memory.repositories import AsyncAssociationRepositoryInterface
 from memory.settings import MemorySettings
+from memory.tracing import CONTEXT_CHARS
+from memory.tracing import HOT_TIER_LOOKUPS
+from memory.tracing import RETRIEVED_CANDIDATES
+from memory.tracing import span
+from memory.vectors import HotVectorIndex
 
 
 class MemoryServiceInterface(Protocol):
@@ -29,12 +46,22 @@ class MemoryServiceInterface(Protocol):
         raise NotImplementedError
 
 
-class MemoryServiceV1(MemoryServiceInterface):
+class AsyncMemoryServiceInterface(Protocol):
+    async def chat(self, user_response: HumanResponse) -> HumanResponse:
+        raise NotImplementedError
+
+    def chat_stream(self, user_response: HumanResponse) -> AsyncIterator[str | HumanResponse]:
+        """Yields answer text as it is generated, then the complete response, then remembers the turn"""
+        raise NotImplementedError
+
+
+class _MemoryServiceV1Base:
     def __init__(self, settings: MemorySettings,
-                 client: GptClientInterface,
-                 association_repository: AssociationRepositoryInterface,
+                 client: GptClientInterface | AsyncGptClientInterface,
+                 association_repository: AssociationRepositoryInterface | AsyncAssociationRepositoryInterface,
                  attention_client: AttentionClientInterface,
-                 dictionary_client: DictionaryClientInterface):
+                 dictionary_client: DictionaryClientInterface | AsyncDictionaryClientInterface,
+                 unit_of_work: UnitOfWorkInterface | AsyncUnitOfWorkInterface):
         """
         That memory service works with words association
         """
@@ -43,64 +70,38 @@ class MemoryServiceV1(MemoryServiceInterface):
         self._repository = association_repository
         self._attention_client = attention_client
         self._dictionary_client = dictionary_client
+        self._unit_of_work = unit_of_work
 
-    def chat(self, user_response: HumanResponse) -> HumanResponse:
-        user_name = user_response.my_name_is
-        message = user_response.answer
-        word_attentions = self._get_word_attentions(message)
-
-        # Find for similarity words associations
-        context = ""
-        seen_conversation_ids = set()
-        for word_attention in word_attentions:
-            triggers = [word_attention]
-            triggers += self._dictionary_client.synonyms(word_attention, self._settings.language)
-
-            for trigger in triggers:
-                associations = self._repository.get_by_key(trigger, self._settings.similarity_percentage)
-                for association in associations:
-                    if association.conversation_id in seen_conversation_ids:
-                        continue
-
-                    seen_conversation_ids.add(association.conversation_id)
+    def _context_builder(self) -> ContextBuilder:
+        return ContextBuilder(self._settings.context_max_chars)
 
-        for conversation_id in seen_conversation_ids:
-            conversation = self._repository.get_conversation_by_id(conversation_id)
-            context += f"[{conversation.date}]({conversation.emotion})"
-            context += f"Negotiator({conversation.user_name}): {conversation.user_message}\n"
-            context += f"Your name({conversation.my_name}): {conversation.my_message}\n\n"
+    def _build_context(self, context: ContextBuilder) -> str:
+        with span('context_build'):
+            built = context.build()
+        CONTEXT_CHARS.observe(len(built))
+        return built
 
-        human_response = self._client.chat_prompt(context, message)
+    def _get_turn_keys(self, word_attentions: list[str], human_response: HumanResponse) -> list[str]:
+        # Emotion association and the words of the user message
+        keys = [human_response.emotion] + word_attentions
 
-        # Create conversation and emotion associations
-        conversation = self._repository.create_conversation(
-            to_conversation_create_dto(human_response, user_name, message))
-        self._repository.create_association(
-            to_association_create_dto(human_response.emotion, conversation.id, -1))
-
-        # Create associations in answer
-        word_attentions += self._get_word_attentions(human_response.answer)
-        for word_attention in word_attentions:
-            self._repository.create_association(
-                to_association_create_dto(word_attention, conversation.id, -1))
-
-        # Create associations in thought
-        word_attentions += self._get_word_attentions(human_response.thought)
-        for word_attention in word_attentions:
-            self._repository.create_association(
-                to_association_create_dto(word_attention, conversation.id, -1))
-
-        # Create associations in thought
-        word_attentions += self._get_word_attentions(' '.join(human_response.association_words))
-        for word_attention in word_attentions:
-            self._repository.create_association(
-                to_association_create_dto(word_attention, conversation.id, -1))
-
-        return human_response
+        # Create associations in answer, thought and gpt associations, scored in one pass
+        for words in self._get_word_attentions_batch([human_response.answer,
+                                                      human_response.thought,
+                                                      ' '.join(human_response.association_words)]):
+            keys += words
+        return keys
 
     def _get_word_attentions(self, message: str) -> list[str]:
-        word_attentions = self._attention_client.attention_scores(message)
+        with span('attention'):
+            return self._select_word_attentions(self._attention_client.attention_scores(message))
+
+    def _get_word_attentions_batch(self, messages: list[str]) -> list[list[str]]:
+        with span('persist.attention'):
+            return [self._select_word_attentions(word_attentions)
+                    for word_attentions in self._attention_client.attention_scores_batch(messages)]
 
+    def _select_word_attentions(self, word_attentions: list[AttentionWord]) -> list[str]:
         # Threshold
         word_attentions = [w for w in word_attentions if w.value >= self._settings.attention_threshold]
 
@@ -112,11 +113,114 @@ class MemoryServiceV1(MemoryServiceInterface):
         return [wa.word for wa in word_attentions[:top_count]]
 
 
-class MemoryServiceV2(MemoryServiceInterface):
+class MemoryServiceV1(_MemoryServiceV1Base, MemoryServiceInterface):
+    def chat(self, user_response: HumanResponse) -> HumanResponse:
+        user_name = user_response.my_name_is
+        message = user_response.answer
+        word_attentions = self._get_word_attentions(message)
+
+        # Find for similarity words associations, all triggers in one lookup
+        context = self._context_builder()
+        with span('synonyms'):
+            synonyms = self._dictionary_client.synonyms_many(word_attentions, self._settings.language)
+        triggers = []
+        for word_attention in word_attentions:
+            triggers += [word_attention] + synonyms[word_attention]
+        with span('key_search'):
+            associations = self._repository.get_by_keys(triggers, self._settings.similarity_percentage)
+        seen_conversation_ids = dict.fromkeys(association.conversation_id for association in associations)
+        RETRIEVED_CANDIDATES.labels('key').observe(len(seen_conversation_ids))
+
+        with span('conversation_fetch'):
+            context.add_all(self._repository.get_conversations_by_ids(list(seen_conversation_ids)))
+
+        context = self._build_context(context)
+        with span('llm'):
+            human_response = self._client.chat_prompt(context, message)
+
+        with span('persist'), self._unit_of_work:
+            # Create conversation and word associations
+            with span('persist.conversations'):
+                conversation = self._repository.create_conversation(
+                    to_conversation_create_dto(human_response, user_name, message))
+            keys = self._get_turn_keys(word_attentions, human_response)
+            with span('persist.associations'):
+                self._repository.create_associations_bulk(
+                    [to_association_create_dto(key, conversation.id, -1) for key in keys])
+
+        return human_response
+
+
+class AsyncMemoryServiceV1(_MemoryServiceV1Base, AsyncMemoryServiceInterface):
+    async def chat(self, user_response: HumanResponse) -> HumanResponse:
+        message = user_response.answer
+        word_attentions, context = await self._get_context(message)
+        with span('llm'):
+            human_response = await self._client.chat_prompt(context, message)
+        await self._remember(user_response, word_attentions, human_response)
+        return human_response
+
+    async def chat_stream(self, user_response: HumanResponse) -> AsyncIterator[str | HumanResponse]:
+        message = user_response.answer
+        word_attentions, context = await self._get_context(message)
+        human_response = None
+        with span('llm'):
+            async for chunk in self._client.chat_prompt_stream(context, message):
+                if isinstance(chunk, HumanResponse):
+                    human_response = chunk
+                else:
+                    yield chunk
+        if human_response is None:
+            raise RuntimeError("Chat stream ended without a complete response")
+
+        # Remembered before the complete response is sent, a client disconnecting meanwhile does not cancel it
+        with anyio.CancelScope(shield=True):
+            await self._remember(user_response, word_attentions, human_response)
+        yield human_response
+
+    async def _get_context(self, message: str) -> tuple[list[str], str]:
+        # Attention is CPU bound, keep it off the event loop
+        word_attentions = await asyncio.to_thread(self._get_word_attentions, message)
+        with span('synonyms'):
+            synonyms = await self._dictionary_client.synonyms_many(word_attentions, self._settings.language)
+
+        # Find for similarity words associations, all triggers in one lookup
+        context = self._context_builder()
+        triggers = []
+        for word_attention in word_attentions:
+            triggers += [word_attention] + synonyms[word_attention]
+        with span('key_search'):
+            associations = await self._repository.get_by_keys(triggers, self._settings.similarity_percentage)
+        seen_conversation_ids = dict.fromkeys(association.conversation_id for association in associations)
+        RETRIEVED_CANDIDATES.labels('key').observe(len(seen_conversation_ids))
+
+        with span('conversation_fetch'):
+            context.add_all(await self._repository.get_conversations_by_ids(list(seen_conversation_ids)))
+        return word_attentions, self._build_context(context)
+
+    async def _remember(self, user_response: HumanResponse, word_attentions: list[str],
+                        human_response: HumanResponse):
+        with span('persist'):
+            keys = await asyncio.to_thread(self._get_turn_keys, word_attentions, human_response)
+            async with self._unit_of_work:
+                # Create conversation and word associations
+                with span('persist.conversations'):
+                    conversation = await self._repository.create_conversation(
+                        to_conversation_create_dto(human_response, user_response.my_name_is, user_response.answer))
+                with span('persist.associations'):
+                    await self._repository.create_associations_bulk(
+                        [to_association_create_dto(key, conversation.id, -1) for key in keys])
+
+
+class _MemoryServiceV2Base:
     def __init__(self, settings: MemorySettings,
-                 client: GptClientInterface,
-                 association_repository: AssociationRepositoryInterface,
-                 sentence_embedding: SentenceEmbeddingInterface):
+                 client: GptClientInterface | AsyncGptClientInterface,
+                 association_repository: AssociationRepositoryInterface | AsyncAssociationRepositoryInterface,
+                 sentence_embedding: SentenceEmbeddingInterface,
+                 temporal_intent_detector: TemporalIntentDetector,
+                 unit_of_work: UnitOfWorkInterface | AsyncUnitOfWorkInterface,
+                 journal: MemoryJournalInterface | None = None,
+                 hot_index: HotVectorIndex | None = None):
         """
         That memory service associate with embeddings vectors
         """
@@ -124,100 +228,278 @@ class MemoryServiceV2(MemoryServiceInterface):
         self._client = client
         self._repository = association_repository
         self._sentence_embedding_client = sentence_embedding
+        self._temporal_intent_detector = temporal_intent_detector
+        self._unit_of_work = unit_of_work
+        self._journal = journal
+        self._hot_index = hot_index
+        self._deduplicator = MinHashDeduplicator(settings.dedupe_threshold)
+
+    def _get_turn_sentences(self, turn: MemoryTurnDTO) -> tuple[list[str], list[str]]:
+        human_response = turn.response
+
+        # Emotion association is embedded as is
+        keys = [human_response.emotion]
+        sentences = [human_response.emotion]
+        for text, name in [
+            # Save associations with user message and emotion
+            (turn.message, turn.user_name),
+            (f"{turn.user_name} {turn.emotion}", turn.user_name),
+            # Create associations in answer and thought
+            (human_response.answer, human_response.my_name_is),
+            (human_response.thought, human_response.my_name_is),
+            # Create associations with gpt subjective associations
+            ('. '.join(f"{s.strip()}" for s in human_response.association_words) + '.', ""),
+        ]:
+            keys += self._get_sentences(text)
+            sentences += self._get_sentences(text, name)
+        return keys, sentences
+
+    def _context_builder(self) -> ContextBuilder:
+        return ContextBuilder(self._settings.context_max_chars)
+
+    def _build_context(self, context: ContextBuilder) -> str:
+        with span('context_build'):
+            built = context.build()
+        CONTEXT_CHARS.observe(len(built))
+        return built
+
+    def _get_prompt_message(self, user_response: HumanResponse) -> str:
+        return f"{user_response.my_name_is}: {user_response.answer}\n Emotion: {user_response.emotion}"
 
+    def _get_sentences(self, text: str, user_name: str = "") -> list[str]:
+        return [f"{f'{user_name}: ' if user_name else ''}{s.strip()}"
+                for s in re.split(r'\.\s*', text) if s.strip()]
+
+    def _get_sentences_embeddings(self, text: str, user_name: str = "") -> np.ndarray:
+        with span('sentence_split'):
+            sentences = self._get_sentences(text, user_name)
+        with span('embed'):
+            return self._sentence_embedding_client.get_sentences_embeddings(sentences)
+
+    def _new_contents(self, content_hashes: list[bytes], sentences: list[str],
+                      embedding_ids: dict[bytes, int]) -> dict[bytes, str]:
+        # Sentences embedded before point at their stored vector, only new content is encoded
+        return {content: sentence for content, sentence in zip(content_hashes, sentences)
+                if content not in embedding_ids}
+
+    def _content_hashes(self, sentences: list[str]) -> list[bytes]:
+        return [content_hash(self._sentence_embedding_client.model_name, sentence) for sentence in sentences]
+
+    def _hot_conversation_ids(self, embeddings: np.ndarray) -> list[int] | None:
+        # Recent memories answer most lookups, pgvector is only asked when the hot tier finds too few
+        if self._hot_index is None:
+            return None
+        with span('hot_search'):
+            conversation_ids = self._hot_index.search(embeddings, self._settings.embedding_top_n,
+                                                      self._settings.embedding_similarity_percentage)
+        if len(conversation_ids) < self._settings.hot_tier_min_results:
+            HOT_TIER_LOOKUPS.labels('miss').inc()
+            return None
+        HOT_TIER_LOOKUPS.labels('hit').inc()
+        return conversation_ids
+
+    def _remember_hot(self, associations: list[AssociationDTO], vectors: dict[int, np.ndarray]):
+        # Added once the turns are committed, so the hot tier never points at rolled back conversations
+        if self._hot_index is None:
+            return
+        with span('persist.hot_index'):
+            self._hot_index.add([association.conversation_id for association in associations],
+                                [association.embedding_id for association in associations],
+                                vectors)
+
+    def _deduplicate(self, conversations: list[ConversationDTO]) -> list[ConversationDTO]:
+        RETRIEVED_CANDIDATES.labels('vector').observe(len(conversations))
+        with span('dedupe'):
+            return self._deduplicator.deduplicate(conversations)
+
+
+class MemoryServiceV2(_MemoryServiceV2Base, MemoryServiceInterface):
     def chat(self, user_response: HumanResponse) -> HumanResponse:
         user_name = user_response.my_name_is
         message = user_response.answer
         emotion = user_response.emotion
 
-        context = ""
-        seen_conversations = {}
+        # Snippets are ranked: similar conversations first, then daily samples
+        context = self._context_builder()
         embeddings = self._get_sentences_embeddings(message, user_name)
-        for embedding in embeddings:
-            conversations = self._repository.get_similar_embedding(embedding, self._settings.embedding_top_n,
-                                                                   self._settings.embedding_similarity_percentage)
-            for conversation in conversations:
-                if conversation.id in seen_conversations:
-                    continue
-
-                # If both messages are too similar
-                is_skip = False
-                for sc in seen_conversations.values():
-                    if SequenceMatcher(None, sc.user_message, conversation.user_message).ratio() >= 0.9 and \
-                        SequenceMatcher(None, sc.my_message, conversation.my_message).ratio() >= 0.9:
-                        is_skip = True
-                        break
-                if is_skip:
-                    continue
-
-                seen_conversations[conversation.id] = conversation
-
-        for conversation in seen_conversations.values():
-            context = self._append_context(context, conversation)
-
-        if self._is_about('вчера', embeddings, 0.9):
-            yesterday = datetime.now().date() - timedelta(days=1)
-            conversations = self._repository.get_random_by_date(yesterday, self._settings.embedding_top_n)
-            for conversation in conversations:
-                context += self._append_context(context, conversation)
-        if self._is_about('сегодня', embeddings, 0.9):
-            today = datetime.now().date()
-            conversations = self._repository.get_random_by_date(today, self._settings.embedding_top_n)
-            for conversation in conversations:
-                context += self._append_context(context, conversation)
-
-        human_response = self._client.chat_prompt(context, f"{user_name}: {message}\n Emotion: {emotion}")
-
-        # My name is
-        my_name_is = f'{human_response.my_name_is}: ' if human_response.my_name_is else ''
-
-        # Create conversation and emotion associations with embeddings
-        conversation = self._repository.create_conversation(
-            to_conversation_create_dto(human_response, user_name, message))
-        embedding = self._repository.create_embedding(
-            to_embedding_create_dto(self._sentence_embedding_client.get_sentences_embeddings(
-                [human_response.emotion])[0]))
-        self._repository.create_association(
-            to_association_create_dto(human_response.emotion, conversation.id, embedding.id))
-
-        # Save associations with user message and emotion
-        self._create_associations(message, conversation.id, user_name)
-        self._create_associations(f"{user_name} {emotion}", conversation.id, user_name)
-
-        # Create associations in answer
-        self._create_associations(human_response.answer, conversation.id, human_response.my_name_is)
-
-        # Create associations in thought
-        self._create_associations(human_response.thought, conversation.id, human_response.my_name_is)
-
-        # Create associations with gpt subjective associations
-        self._create_associations(
-            '. '.join(f"{s.strip()}" for s in
-                      human_response.association_words) + '.', conversation.id, "")
+        context.add_all(self._deduplicate(self._get_similar_conversations(embeddings)))
+
+        for date_range in self._temporal_intent_detector.detect(embeddings):
+            with span('date_search'):
+                conversations = self._repository.get_random_by_range(date_range.start, date_range.end,
+                                                                     self._settings.embedding_top_n)
+            RETRIEVED_CANDIDATES.labels('date').observe(len(conversations))
+            context.add_all(conversations)
+
+        context = self._build_context(context)
+        with span('llm'):
+            human_response = self._client.chat_prompt(context, self._get_prompt_message(user_response))
+
+        turn = MemoryTurnDTO(user_name=user_name, message=message, emotion=emotion, response=human_response)
+        if self._journal is not None:
+            # Persisted later by the memory writer, the user only waits for retrieval and the llm
+            with span('journal'):
+                self._journal.put(turn)
+        else:
+            self.remember([turn])
 
         return human_response
 
-    def _append_context(self, context: str, conversation: ConversationDTO) -> str:
-        context += f"[{conversation.date}]({conversation.emotion})"
-        context += f"Negotiator({conversation.user_name}): {conversation.user_message}\n"
-        context += f"Your name({conversation.my_name}): {conversation.my_message}\n\n"
-        return context
-
-    def _create_associations(self, text: str, conversation_id: int, user_name: str):
-        embeddings = self._get_sentences_embeddings(text, user_name)
-        sentences = self._get_sentences(text)
-        for sentence, embedding in zip(sentences, embeddings):
-            embedding = self._repository.create_embedding(to_embedding_create_dto(embedding))
-            self._repository.create_association(to_association_create_dto(sentence, conversation_id, embedding.id))
-
-    def _get_sentences(self, text: str, user_name: str = "") -> list[str]:
-        return [f"{f'{user_name}: ' if user_name else ''}{s.strip()}"
-                for s in re.split(r'\.\s*', text) if s.strip()]
-
-    def _get_sentences_embeddings(self, text: str, user_name: str = "") -> np.ndarray:
-        return self._sentence_embedding_client.get_sentences_embeddings(self._get_sentences(text, user_name))
+    def remember(self, turns: list[MemoryTurnDTO]):
+        """Stores conversations with their associations, all turns are written in one transaction"""
+        with span('persist'):
+            with self._unit_of_work:
+                associations, vectors = self._remember(turns)
+            self._remember_hot(associations, vectors)
+
+    def _get_similar_conversations(self, embeddings: np.ndarray) -> list[ConversationDTO]:
+        conversation_ids = self._hot_conversation_ids(embeddings)
+        if conversation_ids is not None:
+            with span('hot_fetch'):
+                return self._repository.get_conversations_by_ids(conversation_ids)
+        with span('vector_search'):
+            return self._repository.get_similar_conversations(embeddings, self._settings.embedding_top_n,
+                                                              self._settings.embedding_similarity_percentage)
+
+    def _remember(self, turns: list[MemoryTurnDTO]) -> tuple[list[AssociationDTO], dict[int, np.ndarray]]:
+        keys, sentences, conversation_ids = [], [], []
+        for turn in turns:
+            with span('persist.conversations'):
+                conversation = self._repository.create_conversation(
+                    to_conversation_create_dto(turn.response, turn.user_name, turn.message, turn.date))
+
+            with span('persist.sentence_split'):
+                turn_keys, turn_sentences = self._get_turn_sentences(turn)
+            keys += turn_keys
+            sentences += turn_sentences
+            conversation_ids += [conversation.id] * len(turn_keys)
+
+        return self._create_associations(keys, sentences, conversation_ids)
+
+    def _create_associations(self, keys: list[str], sentences: list[str],
+                             conversation_ids: list[int]) -> tuple[list[AssociationDTO], dict[int, np.ndarray]]:
+        content_hashes = self._content_hashes(sentences)
+        with span('persist.embeddings_lookup'):
+            embedding_ids = self._repository.get_embedding_ids_by_hashes(list(set(content_hashes)))
+        new_contents = self._new_contents(content_hashes, sentences, embedding_ids)
+        new_vectors = {}
+        if new_contents:
+            with span('persist.embed'):
+                vectors = self._sentence_embedding_client.get_sentences_embeddings(list(new_contents.values()))
+            with span('persist.embeddings'):
+                embeddings = self._repository.upsert_embeddings_bulk(
+                    [to_embedding_create_dto(embedding, content)
+                     for content, embedding in zip(new_contents, vectors)])
+            embedding_ids.update({embedding.content_hash: embedding.id for embedding in embeddings})
+            new_vectors = {embedding.id: vector for embedding, vector in zip(embeddings, vectors)}
+        with span('persist.associations'):
+            associations = self._repository.create_associations_bulk(
+                [to_association_create_dto(key, conversation_id, embedding_ids[content])
+                 for key, conversation_id, content in zip(keys, conversation_ids, content_hashes)])
+        return associations, new_vectors
+
+
+class AsyncMemoryServiceV2(_MemoryServiceV2Base, AsyncMemoryServiceInterface):
+    async def chat(self, user_response: HumanResponse) -> HumanResponse:
+        context = await self._get_context(user_response)
+        with span('llm'):
+            human_response = await self._client.chat_prompt(context, self._get_prompt_message(user_response))
+        await self._remember_turn(user_response, human_response)
+        return human_response
 
-    def _is_about(self, about_str: str, embedding: np.ndarray, threshold: float) -> bool:
-        sentence_embedding = self._sentence_embedding_client.get_sentences_embeddings([about_str])
-        sim = cosine_similarity(embedding, sentence_embedding)[0][0]
-        return sim >= threshold
+    async def chat_stream(self, user_response: HumanResponse) -> AsyncIterator[str | HumanResponse]:
+        context = await self._get_context(user_response)
+        human_response = None
+        with span('llm'):
+            async for chunk in self._client.chat_prompt_stream(context, self._get_prompt_message(user_response)):
+                if isinstance(chunk, HumanResponse):
+                    human_response = chunk
+                else:
+                    yield chunk
+        if human_response is None:
+            raise RuntimeError("Chat stream ended without a complete response")
+
+        # Remembered before the complete response is sent, a client disconnecting meanwhile does not cancel it
+        with anyio.CancelScope(shield=True):
+            await self._remember_turn(user_response, human_response)
+        yield human_response
+
+    async def _get_context(self, user_response: HumanResponse) -> str:
+        # Inference is CPU bound, keep it off the event loop
+        # Snippets are ranked: similar conversations first, then daily samples
+        context = self._context_builder()
+        embeddings = await asyncio.to_thread(self._get_sentences_embeddings,
+                                             user_response.answer, user_response.my_name_is)
+        context.add_all(self._deduplicate(await self._get_similar_conversations(embeddings)))
+
+        for date_range in self._temporal_intent_detector.detect(embeddings):
+            with span('date_search'):
+                conversations = await self._repository.get_random_by_range(date_range.start, date_range.end,
+                                                                           self._settings.embedding_top_n)
+            RETRIEVED_CANDIDATES.labels('date').observe(len(conversations))
+            context.add_all(conversations)
+        return self._build_context(context)
+
+    async def _remember_turn(self, user_response: HumanResponse, human_response: HumanResponse):
+        turn = MemoryTurnDTO(user_name=user_response.my_name_is, message=user_response.answer,
+                             emotion=user_response.emotion, response=human_response)
+        if self._journal is not None:
+            # Persisted later by the memory writer, the user only waits for retrieval and the llm
+            with span('journal'):
+                await asyncio.to_thread(self._journal.put, turn)
+        else:
+            await self.remember([turn])
+
+    async def remember(self, turns: list[MemoryTurnDTO]):
+        """Stores conversations with their associations, all turns are written in one transaction"""
+        with span('persist'):
+            async with self._unit_of_work:
+                associations, vectors = await self._remember(turns)
+            self._remember_hot(associations, vectors)
+
+    async def _get_similar_conversations(self, embeddings: np.ndarray) -> list[ConversationDTO]:
+        conversation_ids = await asyncio.to_thread(self._hot_conversation_ids, embeddings)
+        if conversation_ids is not None:
+            with span('hot_fetch'):
+                return await self._repository.get_conversations_by_ids(conversation_ids)
+        with span('vector_search'):
+            return await self._repository.get_similar_conversations(
+                embeddings, self._settings.embedding_top_n, self._settings.embedding_similarity_percentage)
+
+    async def _remember(self, turns: list[MemoryTurnDTO]) -> tuple[list[AssociationDTO], dict[int, np.ndarray]]:
+        keys, sentences, conversation_ids = [], [], []
+        for turn in turns:
+            with span('persist.conversations'):
+                conversation = await self._repository.create_conversation(
+                    to_conversation_create_dto(turn.response, turn.user_name, turn.message, turn.date))
+
+            with span('persist.sentence_split'):
+                turn_keys, turn_sentences = self._get_turn_sentences(turn)
+            keys += turn_keys
+            sentences += turn_sentences
+            conversation_ids += [conversation.id] * len(turn_keys)
+
+        return await self._create_associations(keys, sentences, conversation_ids)
+
+    async def _create_associations(self, keys: list[str], sentences: list[str],
+                                   conversation_ids: list[int]) -> tuple[list[AssociationDTO], dict[int, np.ndarray]]:
+        content_hashes = self._content_hashes(sentences)
+        with span('persist.embeddings_lookup'):
+            embedding_ids = await self._repository.get_embedding_ids_by_hashes(list(set(content_hashes)))
+        new_contents = self._new_contents(content_hashes, sentences, embedding_ids)
+        new_vectors = {}
+        if new_contents:
+            with span('persist.embed'):
+                vectors = await asyncio.to_thread(self._sentence_embedding_client.get_sentences_embeddings,
+                                                  list(new_contents.values()))
+            with span('persist.embeddings'):
+                embeddings = await self._repository.upsert_embeddings_bulk(
+                    [to_embedding_create_dto(embedding, content)
+                     for content, embedding in zip(new_contents, vectors)])
+            embedding_ids.update({embedding.content_hash: embedding.id for embedding in embeddings})
+            new_vectors = {embedding.id: vector for embedding, vector in zip(embeddings, vectors)}
+        with span('persist.associations'):
+            associations = await self._repository.create_associations_bulk(
+                [to_association_create_dto(key, conversation_id, embedding_ids[content])
+                 for key, conversation_id, content in zip(keys, conversation_ids, content_hashes)])
+        return associations, new_vectors
@@ -1,17 +1,36 @@
+from typing import Literal
+
 from pydantic import confloat
 from pydantic_settings import BaseSettings
 
 from common import Language
 
+EmbeddingStorage = Literal['float32', 'halfvec', 'binary']
+
 
 class GoogleSettings(BaseSettings):
     api_key: str
     max_output_tokens: int
 
+    timeout_seconds: float = 30.0
+    max_concurrency: int = 8
+    # Answer with a deterministic local stub instead of calling gemini
+    stub: bool = False
+
 
 class YandexSettings(BaseSettings):
     api_key: str
 
+    timeout_seconds: float = 5.0
+    max_concurrency: int = 8
+
+    cache_size: int = 10000
+    cache_ttl_seconds: float = 7 * 24 * 3600
+    cache_path: str | None = 'cache/dictionary.sqlite3'
+
+    # Answer from a local word -> synonyms JSON file instead of the Yandex API
+    local_path: str | None = None
+
 
 class MemorySettings(BaseSettings):
     language: Language
@@ -21,3 +40,74 @@ class MemorySettings(BaseSettings):
 
     embedding_similarity_percentage: confloat(ge=0.0, le=1.0)
     embedding_top_n: int
+    embedding_ef_search: int = 40
+    # float32 stores full vectors, halfvec half precision ones (pgvector 0.7+), binary stores halfvec
+    # and searches a bit-quantized index, reranking rerank_factor * top_n candidates on the stored vectors.
+    # The database is converted explicitly, alembic -x embedding_storage=halfvec upgrade head
+    embedding_storage: EmbeddingStorage = 'float32'
+    embedding_rerank_factor: int = 4
+
+    # Latest association vectors searched in process before pgvector, 0 disables it.
+    # pgvector is only queried when fewer than hot_tier_min_results conversations are found
+    hot_tier_capacity: int = 4096
+    hot_tier_path: str | None = 'cache/hot_vectors'
+    hot_tier_min_results: int = 5
+
+    # Budget of the memory context sent to the llm, lowest ranked snippets are dropped first
+    context_max_chars: int = 8000
+    # Time references recognized in messages, intent -> phrases, see memory.intents.RESOLVERS
+    temporal_intents: dict[str, list[str]] = {
+        'today': ['сегодня'],
+        'yesterday': ['вчера'],
+        'last_week': ['на прошлой неделе'],
+        'last_month': ['в прошлом месяце'],
+        'monday': ['в понедельник'],
+        'tuesday': ['во вторник'],
+        'wednesday': ['в среду'],
+        'thursday': ['в четверг'],
+        'friday': ['в пятницу'],
+        'saturday': ['в субботу'],
+        'sunday': ['в воскресенье'],
+    }
+    temporal_intent_threshold: confloat(ge=0.0, le=1.0) = 0.9
+    # Estimated Jaccard similarity of both messages above which retrieved conversations are duplicates
+    dedupe_threshold: confloat(ge=0.0, le=1.0) = 0.8
+
+    # Conversations older than consolidation_age_days get associations at least consolidation_similarity alike
+    # merged into centroids, consolidation_max_embeddings > 0 also merges the closest ones until at most that
+    # many are left per conversation. Deletes what it merges, runs every consolidation_interval_seconds in batches,
+    # 0 disables it
+    consolidation_interval_seconds: float = 0.0
+    consolidation_age_days: int = 30
+    consolidation_batch_size: int = 20
+    consolidation_pause_ms: float = 500.0
+    consolidation_similarity: confloat(ge=0.0, le=1.0) = 0.85
+    consolidation_max_embeddings: int = 0
+    # Also adds an llm summary of every consolidated conversation
+    consolidation_summarize: bool = False
+
+    write_behind: bool = True
+    journal_path: str = 'cache/memory_journal.sqlite3'
+    journal_batch_size: int = 32
+    journal_flush_interval_ms: float = 200.0
+    # Attempts are only charged to turns failing on their own, an unreachable database is retried
+    # with exponential backoff up to journal_max_backoff_ms
+    journal_max_attempts: int = 5
+    journal_max_backoff_ms: float = 30000.0
+
+
+class InferenceSettings(BaseSettings):
+    warmup: bool = True
+
+    # torch runs fp32 eager models, quantized uses int8 dynamic quantization,
+    # onnx runs embeddings on ONNX Runtime (attention falls back to quantized)
+    backend: Literal['torch', 'quantized', 'onnx'] = 'torch'
+    onnx_file_name: str | None = None
+
+    batching: bool = True
+    batch_max_size: int = 64
+    batch_max_wait_ms: float = 5.0
+
+    cache_size: int = 10000
+    cache_path: str | None = None
+    cache_disk_capacity: int = 200000
@@ -0,0 +1,47 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import Histogram
+
+STAGE_SECONDS = Histogram('memory_stage_duration_seconds', 'Duration of memory pipeline stages', ['stage'],
+                          buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+RETRIEVED_CANDIDATES = Histogram('memory_retrieved_candidates', 'Conversations retrieved per lookup', ['source'],
+                                 buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500))
+CONTEXT_CHARS = Histogram('memory_context_chars', 'Characters of memory context sent to the llm',
+                          buckets=(0, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+LLM_TOKENS = Counter('memory_llm_tokens', 'Tokens of llm calls', ['kind'])
+HOT_TIER_LOOKUPS = Counter('memory_hot_tier_lookups', 'Vector searches answered by the hot tier or pgvector',
+                           ['result'])
+EMBEDDING_CACHE_LOOKUPS = Counter('memory_embedding_cache_lookups',
+                                  'Sentence embeddings answered by the memory or disk cache tier or missed', ['result'])
+JOURNAL_TURNS = Gauge('memory_journal_turns', 'Turns in the write-behind journal, dead ones ran out of attempts',
+                      ['state'])
+
+# Stage durations of the current request, for the Server-Timing header
+_request_timings: ContextVar[dict[str, float] | None] = ContextVar('memory_request_timings', default=None)
+
+
+def start_request_timings() -> dict[str, float]:
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def to_server_timing(timings: dict[str, float]) -> str:
+    return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
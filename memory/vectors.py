@@ -0,0 +1,128 @@
+import os
+import threading
+
+import numpy as np
+
+
+class HotVectorIndex:
+    def __init__(self, path: str | None, capacity: int):
+        """
+        Most recently remembered association vectors as one contiguous matrix, searched in process
+        before pgvector, kept in memory-mapped .npy files when a path is given so it survives restarts
+        """
+        self._path = path
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._vectors: np.ndarray | None = None
+        self._rows: np.ndarray | None = None
+        self._embedding_rows: dict[int, int] = {}
+        self._size = 0
+        self._next_row = 0
+        self._sequence = 0
+        if path and os.path.exists(self._vectors_path()) and os.path.exists(self._rows_path()):
+            rows = np.lib.format.open_memmap(self._rows_path(), mode='r+')
+            # A changed capacity starts over, the files are recreated on the first add
+            if len(rows) == capacity:
+                self._open(np.lib.format.open_memmap(self._vectors_path(), mode='r+'), rows)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def search(self, embeddings: np.ndarray, top_n: int, similarity_threshold: float) -> list[int]:
+        """Returns conversation ids near any of the embeddings, deduplicated, ordered by embedding then similarity"""
+        if len(embeddings) == 0:
+            return []
+
+        queries = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if not self._size or self._vectors.shape[1] != queries.shape[1]:
+                return []
+            similarities = queries @ self._vectors[:self._size].T
+            conversation_ids = np.array(self._rows['conversation_id'][:self._size])
+
+        top_n = min(top_n, self._size)
+        nearest = np.argpartition(-similarities, top_n - 1, axis=1)[:, :top_n]
+        found = {}
+        for query_index, candidates in enumerate(nearest):
+            for row in candidates[np.argsort(-similarities[query_index, candidates])]:
+                if similarities[query_index, row] < similarity_threshold:
+                    break
+                found.setdefault(int(conversation_ids[row]), None)
+        return list(found)
+
+    def add(self, conversation_ids: list[int], embedding_ids: list[int], vectors: dict[int, np.ndarray]):
+        """
+        Adds associations, a shared embedding missing from vectors reuses its row already in the index
+        """
+        with self._lock:
+            for conversation_id, embedding_id in dict.fromkeys(zip(conversation_ids, embedding_ids)):
+                vector = vectors.get(embedding_id)
+                if vector is None and embedding_id in self._embedding_rows:
+                    vector = np.array(self._vectors[self._embedding_rows[embedding_id]])
+                if vector is not None:
+                    self._put(conversation_id, embedding_id, vector)
+
+    def flush(self):
+        with self._lock:
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+                self._rows.flush()
+
+    def _put(self, conversation_id: int, embedding_id: int, vector: np.ndarray):
+        if self._vectors is None or self._vectors.shape[1] != len(vector):
+            self._create(len(vector))
+
+        # Overwrite the oldest row once the ring is full
+        row = self._next_row
+        if self._rows['sequence'][row]:
+            evicted = int(self._rows['embedding_id'][row])
+            if self._embedding_rows.get(evicted) == row:
+                del self._embedding_rows[evicted]
+
+        self._sequence += 1
+        self._rows[row] = (self._sequence, conversation_id, embedding_id)
+        self._vectors[row] = self._normalize(np.asarray(vector, dtype=np.float32)[None])[0]
+        self._embedding_rows[embedding_id] = row
+        self._next_row = (row + 1) % self._capacity
+        self._size = max(self._size, row + 1)
+
+    def _create(self, dim: int):
+        rows_dtype = np.dtype([('sequence', '<u8'), ('conversation_id', '<i8'), ('embedding_id', '<i8')])
+        if not self._path:
+            self._open(np.zeros((self._capacity, dim), dtype=np.float32), np.zeros(self._capacity, dtype=rows_dtype))
+            return
+
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._open(np.lib.format.open_memmap(self._vectors_path(), mode='w+', dtype=np.float32,
+                                             shape=(self._capacity, dim)),
+                   np.lib.format.open_memmap(self._rows_path(), mode='w+', dtype=rows_dtype,
+                                             shape=(self._capacity,)))
+
+    def _open(self, vectors: np.ndarray, rows: np.ndarray):
+        self._vectors = vectors
+        self._rows = rows
+        filled = np.flatnonzero(rows['sequence'])
+        # Rows are written in order, older ones are the first to be overwritten
+        self._embedding_rows = {int(rows['embedding_id'][row]): int(row)
+                                for row in filled[np.argsort(rows['sequence'][filled])]}
+        if len(filled):
+            last_row = int(np.argmax(rows['sequence']))
+            self._sequence = int(rows['sequence'][last_row])
+            self._next_row = (last_row + 1) % len(rows)
+            self._size = int(filled[-1]) + 1
+        else:
+            self._sequence = 0
+            self._next_row = 0
+            self._size = 0
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _vectors_path(self) -> str:
+        return f'{self._path}.vectors.npy'
+
+    def _rows_path(self) -> str:
+        return f'{self._path}.rows.npy'
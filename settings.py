@@ -1,8 +1,10 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings
 from pydantic_settings import SettingsConfigDict
 
 from database import DatabaseSettings
 from memory.settings import GoogleSettings
+from memory.settings import InferenceSettings
 from memory.settings import MemorySettings
 from memory.settings import YandexSettings
 
@@ -14,3 +16,4 @@ class Settings(BaseSettings):
     memory: MemorySettings
     google: GoogleSettings
     yandex: YandexSettings
+    inference: InferenceSettings = Field(default_factory=InferenceSettings)
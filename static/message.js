@@ -25,7 +25,7 @@ async function sendMessage() {
     const loading = document.getElementById("loading");
     loading.style.display = "block";
 
-    const response = await fetch(`${BACKEND_ROUTE}/api/chat`, {
+    const response = await fetch(`${BACKEND_ROUTE}/api/chat/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
@@ -39,19 +39,65 @@ async function sendMessage() {
         })
     });
 
-    const data = await response.json();
-    if (data) {
-        chat.innerHTML += `<div><span class="user-name">${data.my_name_is} ${data.emotion}:</span> ${data.answer}</div>`;
-    } else {
-        chat.innerHTML += `<div><span class="user-name">server:</span> ${data.error}</div>`;
+    // The answer is rendered as it streams, name and emotion arrive with the complete response
+    const message = document.createElement("div");
+    const name = document.createElement("span");
+    name.className = "user-name";
+    const answer = document.createElement("span");
+    message.append(name, " ", answer);
+    chat.appendChild(message);
+
+    if (!response.ok) {
+        name.textContent = "server:";
+        answer.textContent = response.statusText;
+        loading.style.display = "none";
+        return;
     }
 
-    //if (data.motion.length >= 3)
-    //    requestAndPlayAnimation(data.motion);
-    motion.innerHTML = data.motion;
+    await readEvents(response, (event, data) => {
+        if (event === "answer") {
+            loading.style.display = "none";
+            answer.textContent += data.delta;
+        } else if (event === "response") {
+            name.textContent = `${data.my_name_is} ${data.emotion}:`;
+            answer.textContent = data.answer;
+            //if (data.motion.length >= 3)
+            //    requestAndPlayAnimation(data.motion);
+            motion.innerHTML = data.motion;
+        } else if (event === "error") {
+            name.textContent = "server:";
+            answer.textContent = data.detail;
+        }
+        chat.scrollTop = chat.scrollHeight;
+    });
 
     input.value = "";
     chat.scrollTop = chat.scrollHeight;
 
     loading.style.display = "none";
-}
\ No newline at end of file
+}
+
+async function readEvents(response, onEvent) {
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = "";
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+
+        // Server-sent events are separated by a blank line
+        let separator;
+        while ((separator = buffer.indexOf("\n\n")) >= 0) {
+            const block = buffer.slice(0, separator);
+            buffer = buffer.slice(separator + 2);
+
+            let event = "message";
+            let data = "";
+            for (const line of block.split("\n")) {
+                if (line.startsWith("event: ")) event = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            }
+            onEvent(event, JSON.parse(data));
+        }
+    }
+}
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from common import Language
+from memory.consolidation import MemoryConsolidator
+from memory.consolidation import cluster_vectors
+from memory.dtos import AssociationVectorDTO
+from memory.settings import MemorySettings
+
+
+def _settings(**overrides) -> MemorySettings:
+    return MemorySettings(language=Language.RU,
+                          attention_threshold=0.75,
+                          truncation_percentage=0.75,
+                          similarity_percentage=0.6,
+                          embedding_similarity_percentage=0.7,
+                          embedding_top_n=15,
+                          **overrides)
+
+
+def _association(association_id: int, vector: list[float]) -> AssociationVectorDTO:
+    return AssociationVectorDTO(id=association_id, key=f'key {association_id}', conversation_id=1,
+                                embedding_id=association_id, vector=vector)
+
+
+def test_cluster_vectors_merges_only_similar_vectors():
+    vectors = np.array([[1.0, 0.0, 0.0], [0.99, 0.05, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+
+    labels = cluster_vectors(vectors, 0.9)
+
+    assert labels[0] == labels[1]
+    assert len({labels[0], labels[2], labels[3]}) == 3
+
+
+def test_cluster_vectors_keeps_unrelated_vectors_apart_without_max_clusters():
+    labels = cluster_vectors(np.eye(6), 0.5)
+
+    assert len(set(labels)) == 6
+
+
+def test_cluster_vectors_merges_down_to_max_clusters():
+    labels = cluster_vectors(np.eye(6), 0.5, max_clusters=2)
+
+    assert len(set(labels)) == 2
+
+
+@pytest.mark.parametrize('vectors', [[], [[1.0, 0.0]]])
+def test_clusters_skips_conversations_with_less_than_two_associations(vectors):
+    consolidator = MemoryConsolidator(_settings(), None, None, None)
+
+    assert consolidator._clusters([_association(i, vector) for i, vector in enumerate(vectors)]) == []
+
+
+def test_clusters_returns_only_merged_groups():
+    consolidator = MemoryConsolidator(_settings(consolidation_similarity=0.9), None, None, None)
+    associations = [_association(1, [1.0, 0.0, 0.0]),
+                    _association(2, [0.0, 1.0, 0.0]),
+                    _association(3, [0.99, 0.05, 0.0]),
+                    _association(4, [0.0, 0.0, 1.0])]
+
+    clusters = consolidator._clusters(associations)
+
+    assert [[association.id for association in cluster] for cluster in clusters] == [[1, 3]]
+
+
+def test_clusters_caps_groups_when_max_embeddings_is_set():
+    consolidator = MemoryConsolidator(_settings(consolidation_similarity=0.9, consolidation_max_embeddings=1),
+                                      None, None, None)
+    associations = [_association(i, vector) for i, vector in enumerate(np.eye(3).tolist())]
+
+    clusters = consolidator._clusters(associations)
+
+    assert [[association.id for association in cluster] for cluster in clusters] == [[0, 1, 2]]
@@ -0,0 +1,58 @@
+"""
+Quantized and ONNX inference backends against the fp32 torch baseline, skipped when the models can not be loaded
+"""
+from typing import Callable
+
+import pytest
+
+pytest.importorskip('sentence_transformers')
+
+from benchmarks.inference import MAX_ATTENTION_DIFFERENCE  # noqa: E402
+from benchmarks.inference import MIN_EMBEDDING_COSINE  # noqa: E402
+from benchmarks.inference import SENTENCES  # noqa: E402
+from benchmarks.inference import attention_difference  # noqa: E402
+from benchmarks.inference import embedding_cosine  # noqa: E402
+from memory.clients import AttentionClientV1  # noqa: E402
+from memory.clients import AttentionClientV2  # noqa: E402
+from memory.clients import SentenceEmbeddingV1  # noqa: E402
+from memory.clients import SentenceEmbeddingV2  # noqa: E402
+
+
+def _load(factory: Callable):
+    # Models come from the Hugging Face hub or its local cache
+    try:
+        return factory()
+    except OSError as e:
+        pytest.skip(f"model is not available: {e}")
+
+
+@pytest.fixture(scope='module')
+def baseline_embeddings():
+    return _load(SentenceEmbeddingV1).get_sentences_embeddings(SENTENCES)
+
+
+@pytest.fixture(scope='module')
+def baseline_attention():
+    return _load(AttentionClientV1).attention_scores_batch(SENTENCES)
+
+
+@pytest.mark.parametrize('backend', ['quantized', 'onnx'])
+def test_sentence_embedding_backend_matches_fp32(backend, baseline_embeddings):
+    if backend == 'onnx':
+        pytest.importorskip('onnxruntime')
+        pytest.importorskip('optimum')
+    candidate = _load(lambda: SentenceEmbeddingV2(backend))
+
+    cosine = embedding_cosine(baseline_embeddings, candidate.get_sentences_embeddings(SENTENCES))
+
+    assert cosine.min() >= MIN_EMBEDDING_COSINE
+
+
+def test_quantized_attention_matches_fp32(baseline_attention):
+    candidate = _load(AttentionClientV2)
+
+    actual = candidate.attention_scores_batch(SENTENCES)
+
+    assert [[word.word for word in words] for words in actual] == \
+           [[word.word for word in words] for words in baseline_attention]
+    assert attention_difference(baseline_attention, actual) <= MAX_ATTENTION_DIFFERENCE